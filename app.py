@@ -1,15 +1,35 @@
 """
 Streamlit UI for Compliance Assistant
 """
+import contextlib
+import functools
+import hashlib
+import html
+import os
 import sys
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Final
 project_root = Path(__file__).resolve().parent
 sys.path.insert(0, str(project_root))
 
+import httpx
+import ollama
+import orjson
+import psutil
 import streamlit as st
-from src.llm_agent import ComplianceAgent
+from src.answer_store import AnswerStore
+from src.llm_agent import SYSTEM_PROMPT, ComplianceAgent
+from src.semantic_cache import SemanticCache
 import config
-# import psutil
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None  # GPU metrics are optional
 
 # Page configuration
 st.set_page_config(
@@ -19,8 +39,14 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+SAMPLE_QUERIES: Final[list] = [
+    "What does terminal sterilization usually involve?",
+    "Which guidance is under section 503B of the Federal Food, Drug, and Cosmetic Act?",
+    "What should manufacturers of reusable devices consider?",
+]
+
 # Custom CSS for better styling
-st.markdown("""
+CUSTOM_CSS: Final[str] = """
     <style>
     .main-header {
         font-size: 3rem;
@@ -56,21 +82,188 @@ st.markdown("""
         font-weight: bold;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+# Re-emitted each run: Streamlit drops elements a rerun does not redraw
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Initialize retriever (cached for performance)
 @st.cache_resource
-def load_agent():
-    """Load agent once and cache it"""
+def ollama_client():
+    """One Ollama client (and keep-alive connection pool) shared by all sessions"""
+    transport = httpx.HTTPTransport(
+        retries=2,
+        limits=httpx.Limits(
+            max_connections=config.OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=config.OLLAMA_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+    return ollama.Client(host=config.OLLAMA_HOST, timeout=config.OLLAMA_TIMEOUT, transport=transport)
+
+@st.cache_resource
+def load_agent(model: str = config.LLM_MODEL):
+    """
+    Load agent once and cache it
+    
+    Raises on failure: cache_resource doesn't cache exceptions, so the next
+    call retries (e.g. once Ollama is up) instead of reusing a broken agent.
+    """
+    return ComplianceAgent(model=model, client=ollama_client())
+
+def get_agent(model: str = config.LLM_MODEL):
+    """Script-thread access to the agent; shows setup help and stops on failure"""
     try:
-        return ComplianceAgent(model="llama3.1")
+        return load_agent(model)
     except Exception as e:
         st.error(f"Failed to initialize agent: {e}")
-        st.info("Make sure Ollama is installed and running. Run: `ollama pull llama3.1`")
+        st.info(f"Make sure Ollama is installed and running. Run: `ollama pull {model}`")
         st.stop()
 
-def format_relevance_score(score):
-    """Format relevance score with color coding"""
+def answer_cache_version(agent) -> str:
+    """
+    Fingerprint of everything a cached answer depends on besides its inputs
+    
+    Goes into both answer caches' keys, so a new prompt, re-ingested
+    documents or changed retrieval settings invalidate them. The parent
+    store is written on every ingest batch, so its mtime tracks the corpus.
+    """
+    try:
+        parents_mtime = config.PARENT_STORE_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        parents_mtime = 0
+    
+    parts = (
+        SYSTEM_PROMPT,
+        config.EMBEDDING_MODEL,
+        config.CHUNK_SIZE, config.CHUNK_OVERLAP,
+        config.CHILD_CHUNK_SIZE, config.CHILD_CHUNK_OVERLAP,
+        config.CHILD_OVERFETCH,
+        agent.retriever.vectorstore.collection.count(),
+        parents_mtime,
+    )
+    return hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+
+def warm_up(model: str):
+    """Load the agent, then prefetch answers to the sidebar sample queries"""
+    try:
+        agent = load_agent(model)
+        agent.retriever.embed("warmup")
+        
+        # Sample queries are what users click first; cached_generate returns
+        # persisted answers for free, computes the rest off the critical
+        # path, and leaves them all in the semantic cache for answer_prompt()
+        top_k = config.TOP_K_RESULTS
+        version = answer_cache_version(agent)
+        for query in dict.fromkeys(SAMPLE_QUERIES):
+            cached_generate(query, top_k, model, version)
+    except Exception as e:
+        print(f"✗ Warmup failed: {e}")
+
+@st.cache_resource(show_spinner=False)
+def start_warmup(model: str = config.LLM_MODEL):
+    """Start warming up in the background, once per process"""
+    thread = threading.Thread(target=warm_up, args=(model,), daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def get_generation_slots():
+    """
+    Process-wide cap on answers being generated at once, across sessions
+    
+    Held from retrieval to the last streamed token, so it bounds the
+    streaming path as well as cached_generate's blocking one.
+    """
+    return threading.BoundedSemaphore(config.GENERATION_WORKERS)
+
+@st.cache_resource
+def get_semantic_cache():
+    """Process-wide semantic answer cache"""
+    return SemanticCache()
+
+@st.cache_resource
+def get_answer_store():
+    """Answers persisted across restarts, shared by all sessions"""
+    return AnswerStore()
+
+def find_cached_answer(agent, prompt: str, namespace: tuple) -> tuple:
+    """
+    Look prompt up in the semantic cache, then in the persisted answers
+    
+    A persisted hit is promoted into the semantic cache, so after a restart
+    the first repeat of a question reads SQLite and later ones memory.
+    
+    Returns:
+        (cached result or None, query embedding or None if it wasn't needed)
+    """
+    cache = get_semantic_cache()
+    
+    # Exact match on normalized text first, then near-duplicate questions
+    result = cache.get(namespace, prompt)
+    if result is not None:
+        return result, None
+    
+    embedding = agent.retriever.embed(prompt)
+    result = cache.get_similar(namespace, embedding)
+    if result is None:
+        result = get_answer_store().get(*namespace, prompt)
+        if result is not None:
+            cache.add(namespace, prompt, embedding, result)
+    return result, embedding
+
+def store_answer(prompt: str, namespace: tuple, embedding, result: dict):
+    """Add a freshly generated answer to both caches"""
+    get_semantic_cache().add(namespace, prompt, embedding, result)
+    get_answer_store().put(*namespace, prompt, result)
+
+def cached_generate(prompt: str, top_k: int, model: str, version: str) -> dict:
+    """
+    Return a cached answer, or generate one and cache it
+    
+    version (from answer_cache_version) is only part of the cache key: the
+    persisted answers outlive the process, so answers from an older prompt
+    or corpus must miss rather than be served.
+    """
+    agent = load_agent(model)
+    namespace = (model, top_k, version)
+    
+    result, embedding = find_cached_answer(agent, prompt, namespace)
+    if result is None:
+        with get_generation_slots():
+            result = agent.generate_answer(prompt, top_k=top_k)
+        store_answer(prompt, namespace, embedding, result)
+    return result
+
+def answer_prompt(prompt: str, top_k: int, model: str = config.LLM_MODEL) -> dict:
+    """
+    Display the answer to prompt and return the full result
+    
+    Cached answers render at once; otherwise tokens stream in as Ollama
+    decodes them and the finished answer is added to both caches.
+    """
+    agent = get_agent(model)
+    version = answer_cache_version(agent)
+    namespace = (model, top_k, version)
+    
+    with contextlib.ExitStack() as generation:
+        with st.spinner("🔍 Retrieving relevant documents..."):
+            result, embedding = find_cached_answer(agent, prompt, namespace)
+            if result is None:
+                generation.enter_context(get_generation_slots())
+                result = agent.stream_answer(prompt, top_k=top_k)
+        
+        if 'answer_stream' not in result:
+            st.markdown(result["answer"])
+            return result
+        
+        result['answer'] = st.write_stream(result.pop('answer_stream'))
+    store_answer(prompt, namespace, embedding, result)
+    return result
+
+@functools.lru_cache(maxsize=1024)
+def _format_relevance_permille(permille: int) -> str:
+    """Relevance badge HTML for a score quantized to 0.1%"""
+    score = permille / 1000
     if score >= 0.8:
         color = "#28a745"  # Green
         label = "High"
@@ -83,20 +276,252 @@ def format_relevance_score(score):
     
     return f'<span style="color: {color}; font-weight: bold;">{score:.1%} ({label})</span>'
 
+def format_relevance_score(score):
+    """Format relevance score with color coding"""
+    # Scores only render to 0.1%, so ~1000 buckets cover every output
+    return _format_relevance_permille(round(score * 1000))
+
+def read_files(paths: list) -> list:
+    """Read files concurrently (reads release the GIL), preserving order"""
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=min(32, len(paths))) as pool:
+        return list(pool.map(Path.read_bytes, paths))
+
+def read_pdf_archive(archive_path: Path) -> list:
+    """Read every PDF member of a zip archive through a single open file"""
+    with zipfile.ZipFile(archive_path) as archive:
+        members = sorted(
+            (info for info in archive.infolist()
+             if not info.is_dir() and info.filename.lower().endswith(".pdf")),
+            key=lambda info: info.filename
+        )
+        # Full member paths: two folders may each hold a same-named PDF
+        return [(info.filename, archive.read(info)) for info in members]
+
+def pdf_library_signature(dir_path: Path) -> tuple:
+    """(name, mtime_ns, size) of each PDF, so edited files invalidate the cache"""
+    if not dir_path.is_dir():
+        return ()
+    
+    # DirEntry caches the stat result, so each PDF is stat'ed once
+    with os.scandir(dir_path) as it:
+        entries = [entry for entry in it if entry.name.endswith(".pdf") and entry.is_file()]
+    entries.sort(key=lambda entry: entry.name)
+    
+    signature = []
+    for entry in entries:
+        stat = entry.stat()
+        signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def locate_pdf_library(dir_path: Path) -> tuple:
+    """
+    Find the PDF library and its version signature
+    
+    An aggregated <dir>.zip next to the directory is preferred over the loose
+    files: one open and one central-directory parse instead of one per PDF.
+    """
+    archive_path = dir_path.with_suffix(".zip")
+    if archive_path.is_file():
+        stat = archive_path.stat()
+        return str(archive_path), ((archive_path.name, stat.st_mtime_ns, stat.st_size),)
+    return str(dir_path), pdf_library_signature(dir_path)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_pdf_library(library_path: str, signature: tuple) -> list:
+    """
+    Read each PDF once per library version
+    
+    cache_resource hands every rerun the same list; cache_data would unpickle
+    a fresh copy of all the PDF bytes each time. Callers must not mutate it.
+    """
+    library_path = Path(library_path)
+    if library_path.suffix == ".zip":
+        return read_pdf_archive(library_path)
+    
+    names = [name for name, _, _ in signature]
+    return list(zip(names, read_files([library_path / name for name in names])))
+
+def get_pdf_library(dir_path: Path) -> list:
+    """Return [(path, pdf_bytes)] for the PDFs in dir_path, path relative to the library"""
+    return load_pdf_library(*locate_pdf_library(dir_path))
+
+@st.cache_data(ttl=2, show_spinner=False)
+def get_system_usage() -> dict:
+    """
+    Sample CPU/RAM/GPU usage, reused across reruns for 2 seconds
+    
+    cpu_percent(interval=None) compares against the previous call instead of
+    blocking for a sampling interval, so the very first reading is 0%.
+    """
+    memory = psutil.virtual_memory()
+    usage = {
+        'cpu_percent': psutil.cpu_percent(interval=None),
+        'ram_used_gb': (memory.total - memory.available) / (1024**3),
+        'ram_total_gb': memory.total / (1024**3),
+        'ram_percent': memory.percent,
+        'gpu_percent': None,
+        'gpu_memory_used_gb': None,
+        'gpu_memory_total_gb': None,
+    }
+    
+    if pynvml is not None:
+        try:
+            pynvml.nvmlInit()
+            if pynvml.nvmlDeviceGetCount() > 0:
+                handle = pynvml.nvmlDeviceGetHandleByIndex(0)  # First GPU
+                memory_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
+                usage['gpu_percent'] = pynvml.nvmlDeviceGetUtilizationRates(handle).gpu
+                usage['gpu_memory_used_gb'] = memory_info.used / (1024**3)
+                usage['gpu_memory_total_gb'] = memory_info.total / (1024**3)
+            pynvml.nvmlShutdown()
+        except pynvml.NVMLError:
+            pass  # No GPU/driver: metrics stay None
+    
+    return usage
+
+def qkey(query: str) -> str:
+    """Fixed-size widget key for a query, however long the text"""
+    return "q_" + hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+
+def select_sample_query(key: str):
+    """Button callback: queue the sample query registered under key"""
+    st.session_state.sample_query = st.session_state._qmap[key]
+
 def initialize_session_state():
     """Initialize session state for chat history"""
     if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+        st.session_state.chat_history = deque(maxlen=config.CHAT_HISTORY_MAX_ENTRIES)
+        st.session_state.next_chat_id = 0
 
 def add_to_chat_history(question, answer, sources):
     """Add a Q&A pair to chat history"""
+    # Monotonic ids stay valid while the deque evicts old entries
+    chat_id = st.session_state.next_chat_id
+    st.session_state.next_chat_id += 1
     st.session_state.chat_history.append({
+        'id': chat_id,
         'question': question,
         'answer': answer,
         'sources': sources,
         'num_sources': len(sources)
     })
 
+def get_chat(chat_id):
+    """Return the history entry with chat_id, or None if it was evicted"""
+    for chat in st.session_state.chat_history:
+        if chat['id'] == chat_id:
+            return chat
+    return None
+
+def export_chat_json(chat) -> bytes:
+    """Serialize a history entry (question, answer, sources) as indented JSON"""
+    return orjson.dumps(
+        {
+            'question': chat['question'],
+            'answer': chat['answer'],
+            'sources': chat['sources'],
+        },
+        option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+    )
+
+def select_chat(chat_id):
+    """Button callback: show a history entry"""
+    st.session_state.selected_chat = chat_id
+
+def clear_chat_history():
+    """Button callback: drop all history entries"""
+    st.session_state.chat_history.clear()
+    st.session_state.selected_chat = None
+
+def render_history_buttons(chats):
+    """One button per history entry; clicking selects it"""
+    # Callbacks update state before the click's rerun, so no second
+    # st.rerun() of the whole script is needed
+    for chat in chats:
+        st.button(
+            f"Q: {chat['question'][:50]}...",
+            key=f"chat_{chat['id']}",
+            on_click=select_chat,
+            args=(chat['id'],),
+            use_container_width=True
+        )
+
+def render_selected_chat():
+    """Show the history entry picked in the sidebar"""
+    if st.session_state.selected_chat is None:
+        return
+    
+    selected_chat_data = get_chat(st.session_state.selected_chat)
+    if selected_chat_data is None:
+        return
+    
+    st.markdown(f"### Question: {selected_chat_data['question']}")
+    st.markdown(f"**Answer:**")
+    st.markdown(selected_chat_data['answer'])
+    if selected_chat_data['sources']:
+        st.markdown(f"*Relevant documents: {selected_chat_data['num_sources']}*")
+    
+    # Serialized only for the chat on screen, not for every history entry
+    st.download_button(
+        label="Export as JSON",
+        data=export_chat_json(selected_chat_data),
+        file_name=f"chat_{selected_chat_data['id']}.json",
+        mime="application/json",
+        key=f"export_{selected_chat_data['id']}",
+        on_click="ignore"
+    )
+    st.markdown("---")
+
+def render_messages():
+    """Display the existing chat messages via `st.chat_message`"""
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+def render_sources(result: dict, show_sources: bool, show_context: bool):
+    """Source badges with relevance scores, and the raw LLM context, under an answer"""
+    if show_sources and result['sources']:
+        with st.expander(f"📚 Source documents ({result['num_sources']})"):
+            for source in result['sources']:
+                metadata = source['metadata']
+                name = Path(metadata.get('source', '')).name or metadata.get('filename', 'Unknown')
+                st.markdown(
+                    f'<span class="source-badge">{html.escape(name)}</span> '
+                    f'{format_relevance_score(source["relevance_score"])}',
+                    unsafe_allow_html=True
+                )
+                st.caption(source['matched_text'])
+    
+    if show_context and result.get('context'):
+        with st.expander("Retrieved context"):
+            st.text(result['context'])
+
+def handle_prompt(prompt: str, top_k: int, show_sources: bool = True,
+                  show_context: bool = False):
+    """Display a user prompt, answer it, and record the exchange"""
+    # Store and display the prompt
+    st.session_state.messages.append({"role": "user", "content": prompt})
+    with st.chat_message("user"):
+        st.markdown(prompt)
+    
+    # Generate a response using the ComplianceAgent.
+    with st.chat_message("assistant"):
+        try:
+            # Display the answer (cached, or streamed token by token)
+            result = answer_prompt(prompt, top_k)
+            render_sources(result, show_sources, show_context)
+            
+            # Add to chat history
+            add_to_chat_history(prompt, result["answer"], result['sources'])
+            
+            # Store in messages
+            st.session_state.messages.append({"role": "assistant", "content": result["answer"]})
+            
+        except Exception as e:
+            st.error(f"An error occurred: {e}")
+
 def main():
     # Initialize session state
     initialize_session_state()
@@ -113,7 +538,7 @@ def main():
             "Number of sources",
             min_value=1,
             max_value=10,
-            value=5,
+            value=config.TOP_K_RESULTS,
             help="How many document chunks to retrieve for context"
         )
         
@@ -122,94 +547,67 @@ def main():
         show_context = st.checkbox("Show retrieved context", value=False)
 
         
-        # st.markdown("---")
+        st.markdown("---")
         
-        # # Sources section
-        # st.header("Sources")
-        # try:
-        #     from pathlib import Path
-        #     import base64
-        #     fda_guidance_path = Path(__file__).resolve().parent / "data" / "raw" / "fda_guidance"
-        #     pdf_files = sorted([f for f in fda_guidance_path.glob("*.pdf")])
+        # Sources section
+        st.header("Sources")
+        try:
+            pdf_library = get_pdf_library(config.FDA_GUIDANCE_DIR)
             
-        #     if pdf_files:
-        #         for pdf_path in pdf_files:
-        #             display_name = pdf_path.name.replace("-", " ")
-        #             with open(pdf_path, "rb") as pdf_file:
-        #                 pdf_base64 = base64.b64encode(pdf_file.read()).decode('utf-8')
-        #                 st.markdown(f"<a href='data:application/pdf;base64,{pdf_base64}' target='_blank' style='text-decoration:none'>📄 {display_name}</a>", unsafe_allow_html=True)
-        #     else:
-        #         st.write("No PDFs found in fda_guidance folder")
-        # except Exception as e:
-        #     st.error(f"Error loading sources: {e}")
+            if pdf_library:
+                for member_path, pdf_bytes in pdf_library:
+                    file_name = Path(member_path).name
+                    display_name = file_name.replace("-", " ")
+                    st.download_button(
+                        label=f"📄 {display_name}",
+                        data=pdf_bytes,
+                        file_name=file_name,
+                        mime="application/pdf",
+                        key=f"dl_{member_path}",
+                        on_click="ignore",
+                        use_container_width=True
+                    )
+            else:
+                st.write("No PDFs found in fda_guidance folder")
+        except Exception as e:
+            st.error(f"Error loading sources: {e}")
+        
+        st.markdown("---")
         
-        # TODO: Add real usage stats
         # Usage statistics
-        # st.header("Usage Statistics")
-
-        # # CPU usage
-        # cpu_usage = psutil.cpu_percent(interval=1)
-
-        # # RAM Usage
-        # memory = psutil.virtual_memory()
-        # ram_available = memory.available / (1024**3)  # Convert to GB
-        # ram_total = memory.total / (1024**3)  # Convert to GB
-        # ram_usage_percent = memory.percent  
-
-        # # GPU Usage (if available)
-        # gpu_usage = "N/A"
-        # gpu_memory_used = "N/A"
-        # gpu_memory_total = "N/A"
-        # try:
-        #     pynvml.nvmlInit()
-        #     device_count = pynvml.nvmlDeviceGetCount()
-        #     if device_count > 0:
-        #         handle = pynvml.nvmlDeviceGetHandleByIndex(0)  # Get first GPU
-        #         utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
-        #         memory_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-        #         gpu_usage = utilization.gpu  # GPU core utilization (%)
-        #         gpu_memory_used = memory_info.used / (1024**3)  # Convert to GB
-        #         gpu_memory_total = memory_info.total / (1024**3)  # Convert to GB
-        #     pynvml.nvmlShutdown()
-        # except (pynvml.NVMLError, ImportError):
-        #     pass  # GPU metrics will remain "N/A" if pynvml is not available or no GPU is detected
-
-        # try:
-        #     agent = load_agent()
-        #     stats = agent.retriever.get_stats()
-            
-        # except Exception as e:
-        #     st.error(f"Error: {e}")
-
+        st.header("Usage Statistics")
+        usage = get_system_usage()
+        st.text(f"CPU: {usage['cpu_percent']:.0f}%")
+        st.text(f"RAM: {usage['ram_used_gb']:.1f} / {usage['ram_total_gb']:.1f} GB ({usage['ram_percent']:.0f}%)")
+        if usage['gpu_percent'] is not None:
+            st.text(f"GPU: {usage['gpu_percent']}%")
+            st.text(f"GPU memory: {usage['gpu_memory_used_gb']:.1f} / {usage['gpu_memory_total_gb']:.1f} GB")
         
-        # st.markdown("---")
+        st.markdown("---")
         
         # Sample queries
         st.header("Sample Queries")
-        sample_queries = [
-            "What does terminal sterilization usually involve?",
-            "Which guidance is under section 503B of the Federal Food, Drug, and Cosmetic Act?",
-            "What should manufacturers of reusable devices consider?",
-        ]
+        qmap = st.session_state.setdefault('_qmap', {})
         
-        for query in sample_queries:
-            if st.button(query, key=f"sample_{query}", use_container_width=True):
-                st.session_state.sample_query = query
+        # dict.fromkeys drops duplicates, which would otherwise share a key
+        for query in dict.fromkeys(SAMPLE_QUERIES):
+            key = qkey(query)
+            qmap[key] = query
+            st.button(query, key=key, on_click=select_sample_query, args=(key,), use_container_width=True)
         
         st.markdown("---")
         
         # Chat History in Sidebar
         if st.session_state.chat_history:
             st.header("Chat History")
-            if st.button("Clear History", use_container_width=True):
-                st.session_state.chat_history = []
-                st.session_state.selected_chat = None
-                st.rerun()
+            st.button("Clear History", on_click=clear_chat_history, use_container_width=True)
             
-            for i, chat in enumerate(st.session_state.chat_history):
-                if st.button(f"Q: {chat['question'][:50]}...", key=f"chat_{i}", use_container_width=True):
-                    st.session_state.selected_chat = i
-                    st.rerun()
+            # Newest first; older entries only get widgets when asked for
+            chats = list(reversed(st.session_state.chat_history))
+            render_history_buttons(chats[:config.CHAT_HISTORY_VISIBLE])
+            older = chats[config.CHAT_HISTORY_VISIBLE:]
+            if older and st.toggle(f"Show {len(older)} older questions", key="show_older_history"):
+                render_history_buttons(older)
     
     # Initialize selected_chat if not present
     if 'selected_chat' not in st.session_state:
@@ -221,83 +619,23 @@ def main():
         st.session_state.messages = []
 
     # Load selected chat from history if clicked
-    if st.session_state.selected_chat is not None:
-        selected_idx = st.session_state.selected_chat
-        if selected_idx < len(st.session_state.chat_history):
-            selected_chat_data = st.session_state.chat_history[selected_idx]
-            st.markdown(f"### Question: {selected_chat_data['question']}")
-            st.markdown(f"**Answer:**")
-            st.markdown(selected_chat_data['answer'])
-            if selected_chat_data['sources']:
-                st.markdown(f"*Relevant documents: {selected_chat_data['num_sources']}*")
-            st.markdown("---")
-
-    # Display the existing chat messages via `st.chat_message`.
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-
+    render_selected_chat()
+    
+    render_messages()
+    
     # Check if a sample query was clicked and automatically submit it
     if 'sample_query' in st.session_state:
         sample_query = st.session_state.sample_query
         del st.session_state.sample_query
-        
-        # Store and display the sample query
-        st.session_state.messages.append({"role": "user", "content": sample_query})
-        with st.chat_message("user"):
-            st.markdown(sample_query)
-
-        # Generate a response using the ComplianceAgent.
-        with st.chat_message("assistant"):
-            with st.spinner("🔍 Retrieving relevant documents..."):
-                try:
-                    agent = load_agent()
-                    
-                    # Generate answer
-                    result = agent.generate_answer(sample_query, top_k=top_k)
-                    
-                    # Display the answer
-                    st.markdown(result["answer"])
-                    
-                    # Add to chat history
-                    add_to_chat_history(sample_query, result["answer"], result['sources'])
-                    
-                    # Store in messages
-                    st.session_state.messages.append({"role": "assistant", "content": result["answer"]})
-                    
-                except Exception as e:
-                    st.error(f"An error occurred: {e}")
+        handle_prompt(sample_query, top_k, show_sources, show_context)
     
     # Create a chat input field to allow the user to enter a message. This will display
     # automatically at the bottom of the page.
     if prompt := st.chat_input("Start typing..."):
+        handle_prompt(prompt, top_k, show_sources, show_context)
 
-        # Store and display the current prompt.
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-
-        # Generate a response using the ComplianceAgent.
-        with st.chat_message("assistant"):
-            with st.spinner("Retrieving relevant documents..."):
-                try:
-                    agent = load_agent()
-                    
-                    # Generate answer
-                    result = agent.generate_answer(prompt, top_k=top_k)
-                    
-                    # Display the answer
-                    st.markdown(result["answer"])
-                    
-                    # Add to chat history
-                    add_to_chat_history(prompt, result["answer"], result['sources'])
-                    
-                    # Store in messages
-                    st.session_state.messages.append({"role": "assistant", "content": result["answer"]})
-                    
-                except Exception as e:
-                    st.error(f"An error occurred: {e}")
-
+# The script reruns on every interaction; the cache makes this a one-off
+start_warmup()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
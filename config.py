@@ -2,6 +2,7 @@
 Configuration settings for the compliance assistant
 """
 import os
+import platform
 from pathlib import Path
 
 # Project root directory
@@ -11,18 +12,91 @@ PROJECT_ROOT = Path(__file__).parent
 DATA_DIR = PROJECT_ROOT / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
 PROCESSED_DATA_DIR = DATA_DIR / "processed"
+FDA_GUIDANCE_DIR = RAW_DATA_DIR / "fda_guidance"
+
+# Document ingestion: worker processes used by process_directory
+LOAD_DOCUMENTS_WORKERS = int(
+    os.getenv("LOAD_DOCUMENTS_NUMBER_OF_THREADS", max(1, (os.cpu_count() or 1) - 1))
+)
+LOAD_DOCUMENTS_PREFETCH = 2  # files queued per worker ahead of the consumer
+# Rough file bytes per child chunk, to size an ingest before parsing it
+ESTIMATED_BYTES_PER_CHUNK = 1024
 
 # Vector store
 VECTORSTORE_DIR = PROJECT_ROOT / "vectorstore"
 COLLECTION_NAME = "compliance_docs"
+# Vector index: "chroma", or "hnswlib" (flat-file index + SQLite sidecar,
+# needs the hnswlib package)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 400
+HNSW_INITIAL_CAPACITY = 10_000  # vectors; the index doubles when full
+# Chroma server (`chroma run`); unset means the embedded PersistentClient
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", 8000))
 
 # Embedding settings
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
-CHUNK_SIZE = 1000  # characters
+# Document encoder precision: "fp32", "fp16" or "bf16" (CUDA only; bf16 via
+# autocast), "int8" (the ONNX export below, on CPU) or "auto" (fp16 on CUDA,
+# otherwise int8)
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "auto")
+# Runtime for fp32 on CPU: "torch", "onnx" (graph-optimized export below) or
+# "openvino" (needs sentence-transformers[openvino])
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx")
+OPTIMIZED_ONNX_FILE = "onnx/model_O3.onnx"
+# torch.compile the PyTorch encoder (opt-in: compiles on first use)
+EMBEDDING_COMPILE = os.getenv("EMBEDDING_COMPILE", "0") == "1"
+# CPU threads for encoding (torch, ONNX Runtime, OpenVINO, BLAS); gains flatten past ~8 cores
+EMBED_CPU_THREADS = int(os.getenv("EMBED_CPU_THREADS", min(8, os.cpu_count() or 1)))
+# Ingestion: chunks embedded per batch while the previous batch is written
+INGEST_BATCH_SIZE = 2048
+INGEST_MAX_PENDING_WRITES = 4  # embedded batches queued for Chroma before encoding waits
+MULTIPROC_THRESHOLD = 20_000  # chunks; larger ingests encode on a process pool
+MULTIPROC_CHUNK_SIZE = 512  # texts sent to a pool worker at a time
+# Query encoder: int8-quantized ONNX export of the embedding model
+QUANTIZED_QUERY_ENCODER = True
+QUANTIZED_ONNX_FILE = (
+    "onnx/model_qint8_arm64.onnx" if platform.machine().lower() in ("arm64", "aarch64")
+    else "onnx/model_qint8_avx512_vnni.onnx"
+)
+# Parent-child chunking: small child chunks are embedded and searched, and the
+# parent chunk each hit belongs to is what the LLM sees
+CHUNK_SIZE = 1000  # characters (parent chunks)
 CHUNK_OVERLAP = 200  # characters
+CHILD_CHUNK_SIZE = 250  # characters (embedded child chunks)
+CHILD_CHUNK_OVERLAP = 50  # characters
+PARENT_STORE_PATH = VECTORSTORE_DIR / "parents.sqlite3"  # parent_id -> parent text
 
 # Retrieval settings
 TOP_K_RESULTS = 5
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # distinct query texts kept embedded
+CHILD_OVERFETCH = 4  # child hits fetched per result, before deduping on parent
+FILTER_OVERFETCH = 3  # extra headroom when a category filter is applied
+HNSW_SEARCH_EF = 64  # HNSW query-time candidate list size (minimum; see configure_hnsw_params)
+STATS_SAMPLE_SIZE = 1000  # records whose metadata get_collection_stats tallies
+
+# LLM settings
+LLM_MODEL = "llama3.1"
+LLM_NUM_CTX = 8192  # tokens; fits the system prompt plus 10 retrieved chunks
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_TIMEOUT = 120  # seconds
+OLLAMA_KEEP_ALIVE = "30m"  # keep the model loaded between questions
+OLLAMA_MAX_CONNECTIONS = 32
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = 16
+GENERATION_WORKERS = 4  # answers generated at once across sessions (streamed or not)
+
+# Answer cache: finished answers persisted across restarts
+ANSWER_CACHE_PATH = DATA_DIR / "answer_cache.sqlite3"
+ANSWER_CACHE_MAX_ENTRIES = 512
+
+# Chat history (per browser session)
+CHAT_HISTORY_MAX_ENTRIES = 50  # oldest questions are dropped beyond this
+CHAT_HISTORY_VISIBLE = 10  # newest questions shown without expanding
+
+# Semantic cache: reuse answers for near-identical questions
+SEMANTIC_CACHE_THRESHOLD = 0.97  # cosine similarity
+SEMANTIC_CACHE_MAX_ENTRIES = 1000  # in total, across (model, top_k, answer cache version) namespaces
 
 # Create directories if they don't exist
 for dir_path in [RAW_DATA_DIR, PROCESSED_DATA_DIR, VECTORSTORE_DIR]:
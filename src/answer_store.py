@@ -0,0 +1,70 @@
+"""
+Persistent answer store: finished answers kept across restarts in SQLite
+"""
+import pickle
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+# add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import config
+from src.semantic_cache import SemanticCache
+
+class AnswerStore:
+    """SQLite table of answers keyed on (model, top_k, version, normalized query)"""
+
+    def __init__(self, path: Path = config.ANSWER_CACHE_PATH,
+                 max_entries: int = config.ANSWER_CACHE_MAX_ENTRIES):
+        """
+        Open (or create) the store
+
+        Args:
+            path: SQLite file
+            max_entries: Answers kept in total (oldest evicted first)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared across Streamlit's script threads; the lock serializes access
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "model TEXT NOT NULL, top_k INTEGER NOT NULL, version TEXT NOT NULL, "
+            "query TEXT NOT NULL, result BLOB NOT NULL, "
+            "UNIQUE (model, top_k, version, query))"
+        )
+        self._conn.commit()
+
+    def get(self, model: str, top_k: int, version: str, query: str) -> Optional[Dict]:
+        """Return the stored result for an exact (normalized) query match"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM answers "
+                "WHERE model = ? AND top_k = ? AND version = ? AND query = ?",
+                (model, top_k, version, SemanticCache.normalize(query))
+            ).fetchone()
+        # Pickle, as st.cache_data did: results hold numpy scalars and tuples
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, model: str, top_k: int, version: str, query: str, result: Dict):
+        """Store a result, evicting the oldest answers beyond max_entries"""
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (model, top_k, version, query, result) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (model, top_k, version, SemanticCache.normalize(query), blob)
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE seq NOT IN "
+                "(SELECT seq FROM answers ORDER BY seq DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
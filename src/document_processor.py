@@ -1,12 +1,18 @@
 """
 Document processing: load PDFs/DOCX and chunk them for embedding
 """
+import functools
 import sys
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict
-import PyPDF2
-from docx import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Dict, Iterator, List, Tuple
+import fitz  # PyMuPDF
+from lxml import etree
+from semantic_text_splitter import TextSplitter
 
 # add project root to Python path
 project_root = Path(__file__).parent.parent
@@ -14,71 +20,142 @@ sys.path.insert(0, str(project_root))
 
 import config
 
+# Plain-text extraction without image blocks or ligature preservation
+_PDF_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~(fitz.TEXT_PRESERVE_IMAGES | fitz.TEXT_PRESERVE_LIGATURES)
+
+# File types process_directory picks up
+_DOCUMENT_SUFFIXES = {".pdf", ".docx"}
+
+# WordprocessingML: body paragraphs and the run elements that carry their text
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# Text python-docx's Run.text gives each direct child of a w:r; w:br is
+# handled separately since only a line break (not a page break) is "\n"
+_DOCX_RUN_TEXT = {f"{_W}tab": "\t", f"{_W}cr": "\n",
+                  f"{_W}noBreakHyphen": "-", f"{_W}ptab": "\t"}
+# Paragraph.text covers the paragraph's own runs and those inside hyperlinks,
+# not runs nested in text boxes or other paragraphs
+_DOCX_PARAGRAPH_RUNS = etree.XPath(
+    "./w:r | ./w:hyperlink/w:r",
+    namespaces={"w": _W[1:-1]}
+)
+
+@functools.lru_cache(maxsize=None)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> TextSplitter:
+    """One splitter per (size, overlap) per process, shared across processors"""
+    return TextSplitter(capacity=chunk_size, overlap=chunk_overlap)
+
+def _docx_run_text(run) -> str:
+    """Text of one w:r element, the way python-docx's Run.text reads it"""
+    parts = []
+    for child in run:
+        if child.tag == f"{_W}t":
+            parts.append(child.text or "")
+        elif child.tag == f"{_W}br":
+            # Page and column breaks add no text
+            if child.get(f"{_W}type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        else:
+            parts.append(_DOCX_RUN_TEXT.get(child.tag, ""))
+    return "".join(parts)
+
 class DocumentProcessor:
     """Handle document loading and chunking"""
     
     def __init__(self, chunk_size: int = config.CHUNK_SIZE, 
-                 chunk_overlap: int = config.CHUNK_OVERLAP):
+                 chunk_overlap: int = config.CHUNK_OVERLAP,
+                 child_chunk_size: int = config.CHILD_CHUNK_SIZE,
+                 child_chunk_overlap: int = config.CHILD_CHUNK_OVERLAP):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            add_start_index=True,  
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.child_chunk_size = child_chunk_size
+        self.child_chunk_overlap = child_chunk_overlap
+        # Rust splitter; its semantic levels (paragraph -> line -> sentence ->
+        # word -> character) follow the same cascade as our old separators
+        self.text_splitter = _get_splitter(chunk_size, chunk_overlap)
+        self.child_splitter = _get_splitter(child_chunk_size, child_chunk_overlap)
+    
+    def open_pdf(self, file_path: Path) -> fitz.Document:
+        """
+        Open a PDF from an in-memory copy of the file
+        
+        One sequential read up front; the parser's many small seeks and reads
+        (xref, object streams, inline images) then hit memory, not syscalls.
+        """
+        return fitz.open(stream=file_path.read_bytes(), filetype="pdf")
     
     def load_pdf(self, file_path: Path) -> str:
         """Extract text from PDF"""
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        return text
+        with self.open_pdf(file_path) as doc:
+            return self._pdf_text(doc)
     
     def extract_pdf_metadata(self, file_path: Path) -> Dict:
-        """Extract PDF metadata using PyPDF2"""
-        metadata = {}
+        """Extract PDF metadata using PyMuPDF"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Basic metadata
-                metadata["page_count"] = len(pdf_reader.pages)
-                
-                # PDF info/metadata
-                if pdf_reader.metadata:
-                    pdf_info = pdf_reader.metadata
-                    metadata["author"] = pdf_info.get("/Author", "Unknown")
-                    metadata["title"] = pdf_info.get("/Title", file_path.stem)
-                    metadata["subject"] = pdf_info.get("/Subject", "")
-                    metadata["keywords"] = pdf_info.get("/Keywords", "")
-                    metadata["creator"] = pdf_info.get("/Creator", "")
-                else:
-                    metadata["author"] = "Unknown"
-                    metadata["title"] = file_path.stem
-                    metadata["subject"] = ""
-                    metadata["keywords"] = ""
-                    metadata["creator"] = ""
+            with self.open_pdf(file_path) as doc:
+                return self._pdf_metadata(doc, file_path)
         except Exception as e:
             print(f"  ⚠ Error extracting PDF metadata: {e}")
-            # Set defaults if extraction fails
-            metadata = {
-                "page_count": 0,
-                "author": "Unknown",
-                "title": file_path.stem,
-                "subject": "",
-                "keywords": "",
-                "creator": "",
+            return self._default_pdf_metadata(file_path)
+    
+    def load_pdf_with_metadata(self, file_path: Path) -> Tuple[str, Dict]:
+        """Extract text and metadata from a single open of the PDF"""
+        with self.open_pdf(file_path) as doc:
+            return self._pdf_text(doc), self._pdf_metadata(doc, file_path)
+    
+    def _pdf_text(self, doc: fitz.Document) -> str:
+        """Join the text of every page"""
+        return "\n".join(page.get_text("text", flags=_PDF_TEXT_FLAGS) for page in doc)
+    
+    def _pdf_metadata(self, doc: fitz.Document, file_path: Path) -> Dict:
+        """Read page count and document info, with defaults for missing fields"""
+        try:
+            # PDF info/metadata (missing fields come back as "")
+            pdf_info = doc.metadata or {}
+            return {
+                "page_count": doc.page_count,
+                "author": pdf_info.get("author") or "Unknown",
+                "title": pdf_info.get("title") or file_path.stem,
+                "subject": pdf_info.get("subject") or "",
+                "keywords": pdf_info.get("keywords") or "",
+                "creator": pdf_info.get("creator") or "",
             }
-        
-        return metadata
+        except Exception as e:
+            print(f"  ⚠ Error extracting PDF metadata: {e}")
+            return self._default_pdf_metadata(file_path)
+    
+    @staticmethod
+    def _default_pdf_metadata(file_path: Path) -> Dict:
+        """Metadata used when extraction fails"""
+        return {
+            "page_count": 0,
+            "author": "Unknown",
+            "title": file_path.stem,
+            "subject": "",
+            "keywords": "",
+            "creator": "",
+        }
     
     def load_docx(self, file_path: Path) -> str:
-        """Extract text from DOCX"""
-        doc = Document(file_path)
-        return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+        """
+        Extract text from DOCX
+        
+        Walks word/document.xml directly rather than building python-docx's
+        object per paragraph and run; one line per body paragraph, as before.
+        """
+        with zipfile.ZipFile(file_path) as archive:
+            with archive.open("word/document.xml") as document_xml:
+                root = etree.parse(document_xml).getroot()
+        
+        body = root.find(f"{_W}body")
+        if body is None:
+            return ""
+        
+        return "\n".join(
+            "".join(
+                _docx_run_text(run) for run in _DOCX_PARAGRAPH_RUNS(paragraph)
+            )
+            for paragraph in body.iterfind(f"{_W}p")
+        )
 
     
     def load_document(self, file_path: Path) -> str:
@@ -93,49 +170,140 @@ class DocumentProcessor:
             
     
     def chunk_text(self, text: str, metadata: Dict = None) -> List[Dict]:
-        """Split text into chunks with metadata"""
-        chunks = self.text_splitter.split_text(text)
+        """
+        Split text into parent chunks, then each parent into child chunks
+        
+        Only children are embedded; each carries its parent's id in metadata
+        and the parent text alongside, for the vector store's parent sidecar.
+        
+        Returns:
+            List of dicts with 'text', 'metadata' and 'parent_text' keys
+        """
+        metadata = metadata or {}
+        source = metadata.get("source", "")
+        chunks = []
+        
+        for parent in self.text_splitter.chunks(text):
+            # From the text, not the position: an edit earlier in the file
+            # must not hand this id to a different parent on re-ingest
+            parent_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{parent}"))
+            for child in self.child_splitter.chunks(parent):
+                chunks.append({
+                    "text": child,
+                    "metadata": {
+                        **metadata,
+                        "parent_id": parent_id,
+                        "chunk_index": len(chunks),
+                    },
+                    "parent_text": parent,
+                })
+        
+        return chunks
+    
+    def process_file(self, file_path: Path) -> List[Dict]:
+        """Load, extract metadata for and chunk a single document"""
+        print(f"Processing: {file_path.name}")
         
-        return [
-            {
-                "text": chunk,
-                "metadata": metadata or {}
+        try:
+            # Extract file-level metadata
+            metadata = {
+                "source": str(file_path),
+                "file_size_kb": round(file_path.stat().st_size / 1024, 2),
             }
-            for chunk in chunks
-        ]
+            
+            # PDFs: text and PDF-specific metadata from one open of the file
+            if file_path.suffix.lower() == '.pdf':
+                text, pdf_metadata = self.load_pdf_with_metadata(file_path)
+                metadata.update(pdf_metadata)
+            else:
+                text = self.load_document(file_path)
+            
+            chunks = self.chunk_text(text, metadata)
+            print(f"  → Created {len(chunks)} chunks")
+            print(f"  → Metadata: {len(chunks)} pages, author: {metadata.get('author', 'N/A')}")
+            return chunks
+            
+        except Exception as e:
+            print(f"  ✗ Error processing {file_path.name}: {e}")
+            return []
+    
+    def process_directory(self, directory: Path, max_workers: int = config.LOAD_DOCUMENTS_WORKERS) -> List[Dict]:
+        """
+        Process all documents in a directory
+        
+        Args:
+            directory: Directory searched recursively for PDF/DOCX files
+            max_workers: Worker processes (PDF parsing is CPU-bound, so
+                threads would serialize on the GIL); 1 processes serially
+        """
+        return list(self.iter_chunks(directory, max_workers))
+    
+    @staticmethod
+    def find_documents(directory: Path) -> List[Path]:
+        """PDF/DOCX files under directory, sorted so chunk order is deterministic"""
+        # One walk of the tree; comparing the lowered suffix matches any case
+        # (report.Pdf too), and only matching names are stat'ed
+        return sorted(
+            path for path in directory.rglob("*")
+            if path.suffix.lower() in _DOCUMENT_SUFFIXES and path.is_file()
+        )
     
-    def process_directory(self, directory: Path) -> List[Dict]:
-        """Process all documents in a directory"""
-        all_chunks = []
+    def estimate_chunk_count(self, directory: Path) -> int:
+        """
+        Approximate child chunks iter_chunks(directory) will yield
         
-        for file_path in directory.rglob("*"):
-            if file_path.suffix.lower() in ['.pdf', '.docx']:
-                print(f"Processing: {file_path.name}")
-                
-                try:
-                    text = self.load_document(file_path)
-                    
-                    # Extract file-level metadata
-                    metadata = {
-                        "source": str(file_path),
-                        "file_size_kb": round(file_path.stat().st_size / 1024, 2),
-                    }
-                    
-                    # Add PDF-specific metadata if it's a PDF
-                    if file_path.suffix.lower() == '.pdf':
-                        pdf_metadata = self.extract_pdf_metadata(file_path)
-                        metadata.update(pdf_metadata)
-                    
-                    chunks = self.chunk_text(text, metadata)
-                    all_chunks.extend(chunks)
-                    print(f"  → Created {len(chunks)} chunks")
-                    print(f"  → Metadata: {len(chunks)} pages, author: {metadata.get('author', 'N/A')}")
-                    
-                except Exception as e:
-                    print(f"  ✗ Error processing {file_path.name}: {e}")
+        From file sizes alone, so an ingest can size its index and encode
+        pool before anything is parsed; good to within a tier, not exact.
+        """
+        total_bytes = sum(path.stat().st_size for path in self.find_documents(directory))
+        return total_bytes // config.ESTIMATED_BYTES_PER_CHUNK
+    
+    def iter_chunks(self, directory: Path, max_workers: int = config.LOAD_DOCUMENTS_WORKERS) -> Iterator[Dict]:
+        """
+        Yield the chunks of every document in a directory, file by file
+        
+        Lets ingestion embed the first files while later ones are still
+        being parsed, without holding the whole corpus in memory.
+        
+        Args:
+            directory: Directory searched recursively for PDF/DOCX files
+            max_workers: Worker processes; 1 processes serially
+        """
+        all_files = self.find_documents(directory)
         
-        return all_chunks
+        if max_workers <= 1 or len(all_files) <= 1:
+            for file_path in all_files:
+                yield from self.process_file(file_path)
+            return
+        
+        workers = min(max_workers, len(all_files))
+        settings = (self.chunk_size, self.chunk_overlap,
+                    self.child_chunk_size, self.child_chunk_overlap)
+        files = iter(all_files)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Only a few files ahead, unlike map(), which submits them all and
+            # holds every parsed result however slowly they are consumed.
+            # Futures are drained in submission order, so chunk order is
+            # deterministic.
+            in_flight = deque(
+                pool.submit(_process_one, str(file_path), *settings)
+                for file_path in islice(files, workers * config.LOAD_DOCUMENTS_PREFETCH)
+            )
+            while in_flight:
+                chunks = in_flight.popleft().result()
+                next_file = next(files, None)
+                if next_file is not None:
+                    in_flight.append(pool.submit(_process_one, str(next_file), *settings))
+                yield from chunks
+
 
+def _process_one(file_path: str, chunk_size: int, chunk_overlap: int,
+                 child_chunk_size: int, child_chunk_overlap: int) -> List[Dict]:
+    """Worker entry point: module-level so it can be pickled"""
+    processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                  child_chunk_size=child_chunk_size,
+                                  child_chunk_overlap=child_chunk_overlap)
+    return processor.process_file(Path(file_path))
 
 if __name__ == "__main__":
     # Test the processor
@@ -0,0 +1,308 @@
+"""
+HNSWLIB vector store: a Chroma-compatible collection over an hnswlib index
+with an SQLite sidecar for ids, documents and metadata
+"""
+import json
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+import hnswlib
+import numpy as np
+
+# add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import config
+
+class HnswCollection:
+    """
+    The subset of Chroma's Collection API used by VectorStoreManager
+
+    Vectors (unit-norm, so inner product = cosine) live in an hnswlib index
+    saved as one flat file; labels are the SQLite rowids of the matching
+    id/document/metadata rows. add() only updates memory and the sidecar;
+    persist() writes the index file, once per ingest rather than per batch.
+    """
+
+    def __init__(self, name: str, persist_directory: Path, dim: int):
+        """
+        Open (or create) a collection
+
+        Args:
+            name: Collection name, used for the file names
+            persist_directory: Directory holding the index and sidecar
+            dim: Embedding dimension
+        """
+        self.name = name
+        self.dim = dim
+        self.index_path = persist_directory / f"{name}.hnsw"
+        self.db_path = persist_directory / f"{name}.sqlite3"
+        self.lock_path = persist_directory / f"{name}.lock"
+        # Held from the first write until persist(): while it is, other
+        # processes opening the collection know the sidecar is ahead of
+        # the index file on purpose
+        self._writer_lock: Optional[sqlite3.Connection] = None
+        # _lock guards the sidecar connection and index for reads and writes;
+        # _write_lock serializes writers, so persist() can save the index
+        # without blocking queries
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            # AUTOINCREMENT: a label retired by mark_deleted is never reused
+            "label INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, "
+            "document TEXT, metadata TEXT)"
+        )
+        self._conn.commit()
+
+        if self.index_path.exists():
+            self.index = hnswlib.Index(space="ip", dim=dim)
+            self.index.load_index(str(self.index_path), allow_replace_deleted=True)
+            indexed = set(self.index.get_ids_list())
+        else:
+            self.index = self._new_index()
+            indexed = set()
+        
+        stored = {label for (label,) in self._conn.execute("SELECT label FROM records")}
+        
+        # Rows without a saved vector are left by a writer that died before
+        # persist(); drop them so a re-ingest embeds them again. A live
+        # writer (in this process or another) will save them, so they stay.
+        probe = self._try_writer_lock()
+        if probe is not None:
+            stale = stored - indexed
+            if stale:
+                self._conn.executemany("DELETE FROM records WHERE label = ?",
+                                       [(label,) for label in stale])
+                self._conn.commit()
+                print(f"  ⚠ Dropped {len(stale)} records that were never persisted")
+            probe.close()
+        
+        # Saved vectors whose row was deleted or replaced since must not be returned
+        for label in indexed - stored:
+            try:
+                self.index.mark_deleted(label)
+            except RuntimeError:
+                pass  # already deleted in the saved index
+
+    def _new_index(self) -> hnswlib.Index:
+        """Empty index with the configured graph parameters"""
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(
+            max_elements=config.HNSW_INITIAL_CAPACITY,
+            M=config.HNSW_M,
+            ef_construction=config.HNSW_EF_CONSTRUCTION,
+            allow_replace_deleted=True
+        )
+        return index
+
+    def _try_writer_lock(self) -> Optional[sqlite3.Connection]:
+        """
+        Take the writer lock without waiting, or return None if it is held
+        
+        An exclusive transaction on a separate file: the OS releases it if
+        the holder dies, so a crashed ingest never leaves it stuck.
+        """
+        conn = sqlite3.connect(str(self.lock_path), timeout=0,
+                               isolation_level=None, check_same_thread=False)
+        try:
+            conn.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            conn.close()
+            return None
+        return conn
+
+    def _hold_writer_lock(self):
+        """Take the writer lock for this instance until the next persist()"""
+        if self._writer_lock is None:
+            self._writer_lock = self._try_writer_lock()
+            if self._writer_lock is None:
+                raise RuntimeError(
+                    f"Collection '{self.name}' is being written by another process"
+                )
+
+    def count(self) -> int:
+        """Number of stored vectors"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def add(self, embeddings: np.ndarray, documents: List[str],
+            metadatas: List[Dict], ids: List[str]):
+        """Insert vectors; an existing id has its vector and row replaced"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        with self._write_lock, self._lock:
+            self._hold_writer_lock()
+            # Replaced ids: retire the old label, the row gets a new one
+            placeholders = ",".join("?" * len(ids))
+            for (label,) in self._conn.execute(
+                f"SELECT label FROM records WHERE id IN ({placeholders})", ids
+            ):
+                self.index.mark_deleted(label)
+            self._conn.execute(f"DELETE FROM records WHERE id IN ({placeholders})", ids)
+
+            self._conn.executemany(
+                "INSERT INTO records (id, document, metadata) VALUES (?, ?, ?)",
+                [(id_, document, json.dumps(metadata))
+                 for id_, document, metadata in zip(ids, documents, metadatas)]
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                f"SELECT label, id FROM records WHERE id IN ({placeholders})", ids
+            ).fetchall()
+
+            # Grow geometrically so appends stay amortized O(1)
+            needed = self.index.get_current_count() + len(ids)
+            if needed > self.index.get_max_elements():
+                self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+
+            # Rows come back in label order; line the vectors up with them
+            order = {id_: i for i, id_ in enumerate(ids)}
+            self.index.add_items(
+                embeddings[[order[id_] for _, id_ in rows]],
+                [label for label, _ in rows]
+            )
+
+    upsert = add
+
+    def delete(self, ids: List[str]):
+        """Remove records by id; their vectors stay in the graph, marked deleted"""
+        if not ids:
+            return
+        placeholders = ",".join("?" * len(ids))
+        with self._write_lock, self._lock:
+            self._hold_writer_lock()
+            for (label,) in self._conn.execute(
+                f"SELECT label FROM records WHERE id IN ({placeholders})", ids
+            ):
+                self.index.mark_deleted(label)
+            self._conn.execute(f"DELETE FROM records WHERE id IN ({placeholders})", ids)
+            self._conn.commit()
+
+    def persist(self):
+        """
+        Write the index file
+        
+        Holds only the write lock: queries keep running during the save,
+        while adds (which could resize the index under it) wait. Releases
+        the writer lock, since the file now matches the sidecar.
+        """
+        with self._write_lock:
+            self.index.save_index(str(self.index_path))
+            if self._writer_lock is not None:
+                self._writer_lock.close()
+                self._writer_lock = None
+
+    @staticmethod
+    def _where_sql(where: Dict) -> tuple:
+        """SQL condition and parameters for an equality filter on metadata fields"""
+        clauses = " AND ".join("json_extract(metadata, ?) = ?" for _ in where)
+        params = [p for key, value in where.items() for p in (f"$.{key}", value)]
+        return clauses, params
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            limit: Optional[int] = None,
+            include: List[str] = ("documents", "metadatas")) -> Dict:
+        """Fetch stored records by id and/or metadata filter, or the first `limit` of them"""
+        sql = "SELECT id, document, metadata FROM records"
+        conditions: List[str] = []
+        params: List = []
+        if ids is not None:
+            conditions.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if where:
+            clauses, where_params = self._where_sql(where)
+            conditions.append(clauses)
+            params.extend(where_params)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        result = {"ids": [row[0] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [row[1] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[2]) for row in rows]
+        return result
+
+    def query(self, query_embeddings: np.ndarray, n_results: int = config.TOP_K_RESULTS,
+              where: Optional[Dict] = None,
+              include: List[str] = ("documents", "metadatas", "distances")) -> Dict:
+        """
+        Nearest-neighbour search, shaped like Chroma's query() result
+
+        Args:
+            query_embeddings: (n_queries, dim) array
+            n_results: Neighbours per query
+            where: Optional equality filter on metadata fields
+            include: Fields to return besides ids
+        """
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self._lock:
+            allowed = None
+            if where:
+                clauses, params = self._where_sql(where)
+                allowed = {label for (label,) in self._conn.execute(
+                    f"SELECT label FROM records WHERE {clauses}", params
+                )}
+                n_results = min(n_results, len(allowed))
+            # Deleted labels still count in the index, so use the live rows
+            live = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+            n_results = min(n_results, live)
+            if n_results == 0:
+                return {key: [[] for _ in query_embeddings] for key in result}
+
+            # ef below k would silently cap the result count
+            self.index.set_ef(max(config.HNSW_SEARCH_EF, n_results))
+            # A Python filter takes the GIL per candidate, so one thread with it
+            labels, distances = self.index.knn_query(
+                query_embeddings, k=n_results,
+                num_threads=1 if allowed is not None else -1,
+                filter=(lambda label: label in allowed) if allowed is not None else None
+            )
+
+            for row_labels, row_distances in zip(labels, distances):
+                label_list = [int(label) for label in row_labels]
+                records = {
+                    label: (id_, document, metadata)
+                    for label, id_, document, metadata in self._conn.execute(
+                        "SELECT label, id, document, metadata FROM records "
+                        f"WHERE label IN ({','.join('?' * len(label_list))})",
+                        label_list
+                    )
+                }
+                # Another process may have replaced a row since this index was loaded
+                hits = [(records[label], float(distance))
+                        for label, distance in zip(label_list, row_distances)
+                        if label in records]
+                result["ids"].append([record[0] for record, _ in hits])
+                result["documents"].append([record[1] for record, _ in hits])
+                result["metadatas"].append([json.loads(record[2]) for record, _ in hits])
+                result["distances"].append([distance for _, distance in hits])
+
+        return {key: value for key, value in result.items()
+                if key == "ids" or key in include}
+
+    def delete_all(self):
+        """Drop every record and start a fresh, empty index"""
+        with self._write_lock, self._lock:
+            self._hold_writer_lock()
+            self._conn.execute("DELETE FROM records")
+            self._conn.commit()
+            self.index_path.unlink(missing_ok=True)
+            self.index = self._new_index()
+            # Sidecar and (absent) index file agree again
+            self._writer_lock.close()
+            self._writer_lock = None
@@ -2,6 +2,7 @@
 """
 LLM integration for answer generation
 """
+import asyncio
 import sys
 from pathlib import Path
 project_root = Path(__file__).resolve().parent.parent
@@ -9,31 +10,78 @@ sys.path.insert(0, str(project_root))
 
 
 import config
-from src.retriever import ComplianceRetriever
+from src.retriever import get_retriever
 import ollama  
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+# Kept byte-identical across requests (and shared by chat()) so Ollama can
+# reuse the KV cache of this prefix instead of re-encoding it every query
+SYSTEM_PROMPT = """You are an expert FDA compliance assistant specializing in pharmaceutical manufacturing regulations. 
+
+Your role is to:
+1. Answer questions accurately based ONLY on the provided FDA guidance documents
+2. Cite specific sources when making claims (use [Source N] notation)
+3. Be clear when information is not available in the provided context
+4. Provide practical, actionable guidance
+5. Use professional but accessible language
+
+If the context doesn't contain enough information to fully answer the question, acknowledge this and explain what information is missing.
+
+Each question comes with context from FDA guidance documents. Provide a comprehensive answer based on that context. Remember to:
+- Only use information from the provided sources
+- Cite sources using [Source N] where N is the source number
+- Be specific and detailed
+- If the context is insufficient, clearly state what's missing"""
 
 class ComplianceAgent:
     """Generate answers using retrieved context and Ollama"""
     
-    def __init__(self, model: str = "llama3.1"):
+    def __init__(self, model: str = "llama3.1",
+                 client: Optional[ollama.Client] = None,
+                 async_client: Optional[ollama.AsyncClient] = None):
         """
         Initialize the agent
         
         Args:
             model: Ollama model name (default: llama3.1)
+            client: Ollama client to reuse (default: a new client for OLLAMA_HOST)
+            async_client: Async Ollama client for agenerate_answer (default: a
+                new client for OLLAMA_HOST, created on first use)
         """
         self.model = model
-        self.retriever = ComplianceRetriever()
+        self.client = client or ollama.Client(host=config.OLLAMA_HOST)
+        # Only agenerate_answer needs it, so sync-only callers never open one
+        self._async_client = async_client
+        # Same options on every call: a changed num_ctx makes Ollama reload the model
+        self.options = {'num_ctx': config.LLM_NUM_CTX}
+        self.retriever = get_retriever()
         
         # Verify Ollama is available
         try:
-            ollama.list()
+            self.client.list()
             print(f"✓ Ollama connected, using model: {model}")
         except Exception as e:
             print(f"✗ Ollama error: {e}")
             print("Make sure Ollama is installed and running!")
             raise
+        
+        # Load the model now rather than on the first question
+        try:
+            self.client.chat(
+                model=self.model,
+                messages=[{'role': 'user', 'content': 'ping'}],
+                options={**self.options, 'num_predict': 1},
+                keep_alive=config.OLLAMA_KEEP_ALIVE
+            )
+        except Exception as e:
+            print(f"  ⚠ Model warm-up failed: {e}")
+    
+    @property
+    def async_client(self) -> ollama.AsyncClient:
+        """Async Ollama client, created on first use"""
+        if self._async_client is None:
+            self._async_client = ollama.AsyncClient(host=config.OLLAMA_HOST)
+        return self._async_client
     
     def generate_answer(self, query: str, top_k: int = 5, stream: bool = False) -> Dict:
         """
@@ -52,48 +100,21 @@ class ComplianceAgent:
         results = self.retriever.search(query, top_k=top_k)
         
         # Step 2: Format context for LLM
-        context = self._format_context(results['results'])
+        context = self.retriever.get_context_for_llm(results)
         
-        # Step 3: Create system prompt
-        system_prompt = """You are an expert FDA compliance assistant specializing in pharmaceutical manufacturing regulations. 
-
-Your role is to:
-1. Answer questions accurately based ONLY on the provided FDA guidance documents
-2. Cite specific sources when making claims (use [Source N] notation)
-3. Be clear when information is not available in the provided context
-4. Provide practical, actionable guidance
-5. Use professional but accessible language
-
-If the context doesn't contain enough information to fully answer the question, acknowledge this and explain what information is missing."""
-
-        # Step 4: Create user prompt with context
-        user_prompt = f"""Context from FDA Guidance Documents:
-
-{context}
-
----
-
-Question: {query}
+        # Step 3: Build system + user prompts
+        messages = self._build_messages(query, context)
 
-Please provide a comprehensive answer based on the context above. Remember to:
-- Only use information from the provided sources
-- Cite sources using [Source N] where N is the source number
-- Be specific and detailed
-- If the context is insufficient, clearly state what's missing
-
-Answer:"""
-
-        # Step 5: Generate response
+        # Step 4: Generate response
         print("🤖 Generating answer with Ollama...")
         
         if stream:
             # For streaming responses (useful in UI)
-            response_stream = ollama.chat(
+            response_stream = self.client.chat(
                 model=self.model,
-                messages=[
-                    {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': user_prompt}
-                ],
+                messages=messages,
+                options=self.options,
+                keep_alive=config.OLLAMA_KEEP_ALIVE,
                 stream=True
             )
             return {
@@ -101,16 +122,16 @@ Answer:"""
                 'answer_stream': response_stream,
                 'sources': results['results'],
                 'num_sources': len(results['results']),
-                'context': context
+                'context': context,
+                'model': self.model
             }
         else:
             # Regular response
-            response = ollama.chat(
+            response = self.client.chat(
                 model=self.model,
-                messages=[
-                    {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': user_prompt}
-                ]
+                messages=messages,
+                options=self.options,
+                keep_alive=config.OLLAMA_KEEP_ALIVE
             )
             
             return {
@@ -122,20 +143,76 @@ Answer:"""
                 'model': self.model
             }
     
-    def _format_context(self, sources: List[Dict]) -> str:
-        """Format retrieved sources into context string"""
-        context_parts = []
-        
-        for i, source in enumerate(sources, 1):
-            filename = source['metadata'].get('filename', 'Unknown')
-            text = source['text']
-            relevance = source['relevance_score']
+    def _build_messages(self, query: str, context: str) -> List[Dict]:
+        """Build the system + user messages for a question and its context"""
+        # Everything static lives in SYSTEM_PROMPT; only this message varies
+        user_prompt = f"""Context from FDA Guidance Documents:
+
+{context}
+
+---
+
+Question: {query}
+
+Answer:"""
+        
+        return [
+            {'role': 'system', 'content': SYSTEM_PROMPT},
+            {'role': 'user', 'content': user_prompt}
+        ]
+    
+    async def agenerate_answer(self, query: str, top_k: int = 5) -> Dict:
+        """
+        Async generate_answer: retrieval runs while Ollama loads the model
+        
+        Args:
+            query: User's question
+            top_k: Number of document chunks to retrieve
             
-            context_parts.append(
-                f"[Source {i}] - {filename} (Relevance: {relevance:.1%})\n{text}"
-            )
+        Returns:
+            Dict with question, answer, sources, and metadata
+        """
+        # Chroma is sync (asearch runs it in a thread); an empty request makes
+        # Ollama load the model, so neither waits for the other
+        results, _ = await asyncio.gather(
+            self.retriever.asearch(query, top_k=top_k),
+            self.async_client.generate(model=self.model, prompt="", options=self.options,
+                                       keep_alive=config.OLLAMA_KEEP_ALIVE)
+        )
+        context = self.retriever.get_context_for_llm(results)
+        
+        response = await self.async_client.chat(
+            model=self.model,
+            messages=self._build_messages(query, context),
+            options=self.options,
+            keep_alive=config.OLLAMA_KEEP_ALIVE
+        )
         
-        return "\n\n---\n\n".join(context_parts)
+        return {
+            'question': query,
+            'answer': response['message']['content'],
+            'sources': results['results'],
+            'num_sources': len(results['results']),
+            'context': context,
+            'model': self.model
+        }
+    
+    def stream_answer(self, query: str, top_k: int = 5) -> Dict:
+        """
+        Generate an answer whose text arrives as it is decoded
+        
+        Args:
+            query: User's question
+            top_k: Number of document chunks to retrieve
+            
+        Returns:
+            Dict like generate_answer(stream=True), with 'answer_stream'
+            yielding plain text chunks
+        """
+        result = self.generate_answer(query, top_k=top_k, stream=True)
+        response_stream = result['answer_stream']
+        result['answer_stream'] = (chunk['message']['content'] for chunk in response_stream)
+        return result
     
     def chat(self, query: str, conversation_history: List[Dict] = None, top_k: int = 5) -> Dict:
         """
@@ -151,11 +228,11 @@ Answer:"""
         """
         # Retrieve context for current query
         results = self.retriever.search(query, top_k=top_k)
-        context = self._format_context(results['results'])
+        context = self.retriever.get_context_for_llm(results)
         
         # Build conversation with context
         messages = [
-            {'role': 'system', 'content': 'You are an expert FDA compliance assistant.'}
+            {'role': 'system', 'content': SYSTEM_PROMPT}
         ]
         
         # Add conversation history if exists
@@ -169,7 +246,8 @@ Answer:"""
         })
         
         # Generate response
-        response = ollama.chat(model=self.model, messages=messages)
+        response = self.client.chat(model=self.model, messages=messages, options=self.options,
+                                    keep_alive=config.OLLAMA_KEEP_ALIVE)
         
         # Update history
         updated_history = conversation_history.copy() if conversation_history else []
@@ -1,6 +1,8 @@
 """
 Retriever module: Clean interface for querying the vector store
 """
+import asyncio
+import functools
 import sys
 from pathlib import Path
 project_root = Path(__file__).resolve().parent.parent
@@ -9,6 +11,16 @@ sys.path.insert(0, str(project_root))
 import config
 from src.vectorstore_manager import VectorStoreManager
 from typing import List, Dict, Optional
+import numpy as np
+
+def format_context(sources: List[Dict]) -> str:
+    """Format retrieved sources into a numbered context string for the LLM"""
+    return "\n\n---\n\n".join(
+        f"[Source {i}] - {source['metadata'].get('filename', 'Unknown')} "
+        f"(Relevance: {source['relevance_score']:.1%})\n{source['text']}"
+        for i, source in enumerate(sources, 1)
+    )
+
 
 class ComplianceRetriever:
     """High-level interface for retrieving compliance information"""
@@ -18,6 +30,12 @@ class ComplianceRetriever:
         self.vectorstore = VectorStoreManager()
         print(f"✓ Retriever initialized with {self.vectorstore.collection.count()} documents")
     
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a query with the vector store's model (L2-normalized)"""
+        # Shares the vector store's query-embedding cache, so the semantic
+        # cache lookup and the search that follows encode the query once
+        return self.vectorstore.embed_query(text)
+    
     def search(self, 
                query: str, 
                top_k: int = config.TOP_K_RESULTS,
@@ -25,6 +43,9 @@ class ComplianceRetriever:
         """
         Search for relevant documents
         
+        Child chunks are matched, then deduplicated on their parent so each
+        result is a distinct parent chunk, scored by its best-matching child.
+        
         Args:
             query: The search question
             top_k: Number of results to return
@@ -36,22 +57,42 @@ class ComplianceRetriever:
         # Build metadata filter if category specified
         metadata_filter = {"category": category_filter} if category_filter else None
         
-        # Query vector store
+        # Query vector store; over-fetch since neighbouring children share a
+        # parent, and more so under a filter so one probe still fills top_k
+        n_results = top_k * config.CHILD_OVERFETCH
+        if metadata_filter:
+            n_results *= config.FILTER_OVERFETCH
         results = self.vectorstore.query(
             query_text=query,
-            n_results=top_k,
+            n_results=n_results,
             filter_metadata=metadata_filter
         )
         
-        # Format results
+        # Keep the best (first) child per parent
         formatted_results = []
+        seen_parents = set()
         for i in range(len(results['documents'][0])):
+            metadata = results['metadatas'][0][i]
+            parent_id = metadata.get('parent_id')
+            if parent_id is not None:
+                if parent_id in seen_parents:
+                    continue
+                seen_parents.add(parent_id)
+            
             formatted_results.append({
                 'text': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
+                'matched_text': results['documents'][0][i],
+                'metadata': metadata,
                 'distance': results['distances'][0][i],
                 'relevance_score': 1 - results['distances'][0][i]  # Convert distance to similarity
             })
+            if len(formatted_results) == top_k:
+                break
+        
+        # Swap in parent text; chunks indexed before parent-child keep their own
+        parent_texts = self.vectorstore.get_parent_texts(list(seen_parents))
+        for result in formatted_results:
+            result['text'] = parent_texts.get(result['metadata'].get('parent_id'), result['text'])
         
         return {
             'query': query,
@@ -59,36 +100,47 @@ class ComplianceRetriever:
             'results': formatted_results
         }
     
-    def get_context_for_llm(self, query: str, top_k: int = 5) -> str:
+    async def asearch(self, 
+                      query: str, 
+                      top_k: int = config.TOP_K_RESULTS,
+                      category_filter: Optional[str] = None) -> Dict:
         """
-        Get formatted context string for LLM prompting
+        Async search: runs the (synchronous) Chroma query in a worker thread
         
         Args:
-            query: The user's question
-            top_k: Number of chunks to retrieve
+            query: The search question
+            top_k: Number of results to return
+            category_filter: Optional filter by category (e.g., 'fda_guidance')
             
         Returns:
-            Formatted context string with sources
+            Dict with results and metadata, as search()
         """
-        search_results = self.search(query, top_k=top_k)
+        return await asyncio.to_thread(self.search, query, top_k, category_filter)
+    
+    def get_context_for_llm(self, search_results: Dict) -> str:
+        """
+        Get formatted context string for LLM prompting
         
-        context_parts = []
-        for i, result in enumerate(search_results['results'], 1):
-            source = result['metadata'].get('filename', 'Unknown')
-            text = result['text']
-            score = result['relevance_score']
+        Args:
+            search_results: Output of search(), so callers that already
+                have results don't pay for a second embedding + vector query
             
-            context_parts.append(
-                f"[Source {i}: {source} (relevance: {score:.2f})]\n{text}\n"
-            )
-        
-        return "\n---\n".join(context_parts)
+        Returns:
+            Formatted context string with sources
+        """
+        return format_context(search_results['results'])
     
     def get_stats(self) -> Dict:
         """Get retriever statistics"""
         return self.vectorstore.get_collection_stats()
 
 
+@functools.lru_cache(maxsize=1)
+def get_retriever() -> ComplianceRetriever:
+    """Process-wide retriever, so the embedding model and Chroma load once"""
+    return ComplianceRetriever()
+
+
 def main():
     """Test the retriever with FDA-specific queries"""
     print("=" * 80)
@@ -126,7 +178,7 @@ def main():
     print("\n" + "="*80)
     print("EXAMPLE: Formatted Context for LLM")
     print("="*80)
-    context = retriever.get_context_for_llm(test_queries[0], top_k=2)
+    context = retriever.get_context_for_llm(retriever.search(test_queries[0], top_k=2))
     print(context[:500] + "...\n")
     
     # Show stats
@@ -0,0 +1,114 @@
+"""
+Semantic answer cache: reuse answers for repeated or near-identical questions
+"""
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+
+# add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import config
+
+class SemanticCache:
+    """Namespace-aware answer cache with exact and embedding-similarity lookup"""
+
+    def __init__(self,
+                 threshold: float = config.SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = config.SEMANTIC_CACHE_MAX_ENTRIES):
+        """
+        Initialize the cache
+
+        Args:
+            threshold: Minimum cosine similarity for a semantic hit
+            max_entries: Maximum entries kept across all namespaces (oldest
+                evicted first, so namespaces that stop receiving answers,
+                e.g. an old answer cache version, drain away)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        # Per namespace: normalized query -> result, plus parallel
+        # (keys, embedding matrix) for the brute-force similarity search
+        self._exact: Dict[Hashable, Dict[str, Dict]] = {}
+        self._keys: Dict[Hashable, List[str]] = {}
+        self._matrix: Dict[Hashable, np.ndarray] = {}
+        # Namespace of every entry, oldest first: the global eviction order
+        self._order: deque = deque()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize query text for exact matching"""
+        return " ".join(query.lower().split())
+
+    def get(self, namespace: Hashable, query: str) -> Optional[Dict]:
+        """Return the cached result for an exact (normalized) query match"""
+        with self._lock:
+            return self._exact.get(namespace, {}).get(self.normalize(query))
+
+    def get_similar(self, namespace: Hashable, embedding: np.ndarray) -> Optional[Dict]:
+        """
+        Return the cached result whose query embedding is most similar
+
+        Args:
+            namespace: Cache namespace (e.g. (model, top_k))
+            embedding: L2-normalized query embedding
+
+        Returns:
+            Cached result if the best match clears the threshold, else None
+        """
+        with self._lock:
+            matrix = self._matrix.get(namespace)
+            if matrix is None:
+                return None
+
+            # Embeddings are unit-norm, so the dot product is cosine similarity
+            similarities = matrix @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            key = self._keys[namespace][best]
+            return self._exact[namespace][key]
+
+    def add(self, namespace: Hashable, query: str, embedding: np.ndarray, result: Dict):
+        """Store a result under its normalized query and embedding"""
+        key = self.normalize(query)
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+
+        with self._lock:
+            exact = self._exact.get(namespace)
+            if exact is not None and key in exact:
+                exact[key] = result
+                return
+
+            # Evict the oldest entry overall once the cache is full; entries
+            # are appended in order, so it is the first of its namespace
+            if len(self._order) >= self.max_entries:
+                self._evict_oldest()
+
+            # After eviction, which may have dropped this very namespace
+            exact = self._exact.setdefault(namespace, {})
+            keys = self._keys.setdefault(namespace, [])
+            matrix = self._matrix.get(namespace)
+            exact[key] = result
+            keys.append(key)
+            self._order.append(namespace)
+            self._matrix[namespace] = (
+                embedding if matrix is None else np.vstack([matrix, embedding])
+            )
+
+    def _evict_oldest(self):
+        """Drop the oldest entry, and its namespace once that is empty (lock held)"""
+        namespace = self._order.popleft()
+        keys = self._keys[namespace]
+        del self._exact[namespace][keys.pop(0)]
+        if keys:
+            self._matrix[namespace] = self._matrix[namespace][1:]
+        else:
+            del self._exact[namespace], self._keys[namespace], self._matrix[namespace]
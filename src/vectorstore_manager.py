@@ -1,13 +1,18 @@
 """
 Vector store management: embedding generation and ChromaDB operations
 """
+import contextlib
+import functools
+import hashlib
+import os
+import sqlite3
 import sys
+import threading
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from tqdm import tqdm
+from itertools import chain, islice
+from typing import Dict, Iterable, List, Optional
 
 
 '''
@@ -20,95 +25,525 @@ sys.path.insert(0, str(project_root))
 
 import config
 
+# OpenMP/MKL/OpenBLAS size their thread pools when the first library using
+# them loads (numpy, directly or via chromadb, then torch), so these must be
+# set before any of those imports; explicit environment settings win.
+# ONNX Runtime ignores them; its sessions get ort_session_options() instead.
+os.environ.setdefault("OMP_NUM_THREADS", str(config.EMBED_CPU_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(config.EMBED_CPU_THREADS))
+os.environ.setdefault("OPENBLAS_NUM_THREADS", str(config.EMBED_CPU_THREADS))
+
+import chromadb
+import numpy as np
+import torch
+from chromadb.config import Settings
+from sentence_transformers import SentenceTransformer
+from tqdm import tqdm
+
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+def resolve_precision(precision: str = config.EMBEDDING_PRECISION) -> str:
+    """Map the configured precision to one this machine can run"""
+    if precision == "auto":
+        return "fp16" if DEVICE == "cuda" else "int8"
+    if precision in ("fp16", "bf16") and DEVICE != "cuda":
+        print(f"  ⚠ {precision} embeddings need CUDA, using float32 model")
+        return "fp32"
+    return precision
+
+def compile_model(model: SentenceTransformer) -> SentenceTransformer:
+    """
+    torch.compile the transformer inside a PyTorch model, if enabled
+    
+    dynamic=True because batch and sequence lengths vary per call; the first
+    encode() of each new shape family pays the compile cost.
+    """
+    if config.EMBEDDING_COMPILE:
+        model[0].auto_model = torch.compile(model[0].auto_model, dynamic=True)
+        print("✓ Embedding model compiled")
+    return model
+
+def ort_session_options():
+    """ONNX Runtime session options capped at EMBED_CPU_THREADS (ORT defaults to every core)"""
+    import onnxruntime  # installed with sentence-transformers[onnx]
+    
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = config.EMBED_CPU_THREADS
+    # One graph runs at a time per session; a second pool would oversubscribe
+    options.inter_op_num_threads = 1
+    return options
+
+@functools.lru_cache(maxsize=None)
+def load_float_model(model_name: str = config.EMBEDDING_MODEL) -> SentenceTransformer:
+    """Load the float32 PyTorch model once per process"""
+    print(f"Loading embedding model: {model_name} ({DEVICE})")
+    if DEVICE == "cpu":
+        # Intra-op threads only; a second pool on top would oversubscribe
+        torch.set_num_threads(config.EMBED_CPU_THREADS)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # only settable before torch's first parallel op
+    model = SentenceTransformer(model_name, device=DEVICE)
+    print("✓ Embedding model loaded\n")
+    return compile_model(model)
+
+@functools.lru_cache(maxsize=None)
+def load_cpu_backend_model(model_name: str = config.EMBEDDING_MODEL,
+                           backend: str = config.EMBEDDING_BACKEND) -> SentenceTransformer:
+    """Load the float32 model on ONNX Runtime or OpenVINO instead of torch"""
+    if backend == "onnx":
+        model_kwargs = {"file_name": config.OPTIMIZED_ONNX_FILE,
+                        "session_options": ort_session_options()}
+    else:
+        # OpenVINO has its own thread setting
+        model_kwargs = {"ov_config": {"INFERENCE_NUM_THREADS": str(config.EMBED_CPU_THREADS)}}
+    model = SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs)
+    print(f"✓ Embedding model loaded ({backend})\n")
+    return model
+
+@functools.lru_cache(maxsize=None)
+def load_int8_model(model_name: str = config.EMBEDDING_MODEL) -> SentenceTransformer:
+    """Load the int8 ONNX export (dynamic quantization, VNNI/NEON dot products)"""
+    model = SentenceTransformer(
+        model_name,
+        backend="onnx",
+        model_kwargs={
+            "file_name": config.QUANTIZED_ONNX_FILE,
+            "provider": "CPUExecutionProvider",
+            "session_options": ort_session_options(),
+        }
+    )
+    print(f"✓ Quantized encoder loaded: {config.QUANTIZED_ONNX_FILE}")
+    return model
+
+@functools.lru_cache(maxsize=None)
+def load_embedding_model(model_name: str = config.EMBEDDING_MODEL,
+                         precision: str = "fp32") -> SentenceTransformer:
+    """
+    Load the document encoder at a resolved precision (see resolve_precision)
+    
+    bf16 keeps float32 weights; generate_embeddings runs it under autocast.
+    """
+    if precision == "fp16":
+        # Fresh instance: halving in place would also halve load_float_model's
+        model = SentenceTransformer(model_name, device="cuda").half()
+        print("✓ Embedding model loaded (fp16, CUDA)\n")
+        return compile_model(model)
+    elif precision == "int8":
+        try:
+            return load_int8_model(model_name)
+        except Exception as e:
+            print(f"  ⚠ Quantized encoder unavailable ({e}), using float32 model")
+    
+    if DEVICE == "cpu" and config.EMBEDDING_BACKEND != "torch":
+        try:
+            return load_cpu_backend_model(model_name, config.EMBEDDING_BACKEND)
+        except Exception as e:
+            print(f"  ⚠ {config.EMBEDDING_BACKEND} backend unavailable ({e}), using torch")
+    
+    return load_float_model(model_name)
+
+@functools.lru_cache(maxsize=None)
+def load_query_model(model_name: str = config.EMBEDDING_MODEL) -> SentenceTransformer:
+    """Load the int8 ONNX query encoder, falling back to the float32 model"""
+    if not config.QUANTIZED_QUERY_ENCODER:
+        return load_embedding_model(model_name)
+    
+    try:
+        return load_int8_model(model_name)
+    except Exception as e:
+        print(f"  ⚠ Quantized query encoder unavailable ({e}), using float32 model")
+        return load_float_model(model_name)
+
+
+@functools.lru_cache(maxsize=config.QUERY_EMBEDDING_CACHE_SIZE)
+def _cached_query_embedding(text: str, model_name: str = config.EMBEDDING_MODEL) -> np.ndarray:
+    """Unit-norm query embedding, computed once per distinct text (read-only result)"""
+    embedding = np.ascontiguousarray(
+        load_query_model(model_name).encode(
+            [text], convert_to_numpy=True, normalize_embeddings=True
+        )[0],
+        dtype=np.float32
+    )
+    # Shared by every caller, so nobody may modify it in place
+    embedding.flags.writeable = False
+    return embedding
+
+def chunk_id(chunk: Dict) -> str:
+    """
+    Deterministic id for a chunk: its source, position and text
+    
+    Re-ingesting the same document yields the same ids, unlike a running
+    counter that depends on what else was ingested in the batch.
+    """
+    metadata = chunk['metadata']
+    key = f"{metadata.get('source', '')}\0{metadata.get('chunk_index', '')}\0{chunk['text']}"
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+def configure_hnsw_params(vector_count: int) -> Dict[str, int]:
+    """
+    HNSW graph parameters sized for a corpus
+    
+    Larger graphs need more links per node (M) and wider candidate lists
+    to hold recall; small ones stay cheap to build and probe.
+    
+    Args:
+        vector_count: Number of vectors the index will hold
+        
+    Returns:
+        Dict with 'M', 'ef_construction' and 'ef_search'
+    """
+    if vector_count < 10_000:
+        params = {"M": 16, "ef_construction": 100, "ef_search": 64}
+    elif vector_count < 100_000:
+        params = {"M": 24, "ef_construction": 200, "ef_search": 100}
+    else:
+        params = {"M": 32, "ef_construction": 400, "ef_search": 128}
+    params["ef_search"] = max(params["ef_search"], config.HNSW_SEARCH_EF)
+    return params
+
+
+class ParentStore:
+    """SQLite sidecar mapping parent_id -> parent chunk text"""
+    
+    def __init__(self, path: Path = config.PARENT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Shared across Streamlit's script threads; the lock serializes access
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parents (id TEXT PRIMARY KEY, text TEXT NOT NULL)"
+        )
+        self._conn.commit()
+    
+    def put_many(self, parents: Dict[str, str]):
+        """Insert or replace parent texts"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO parents (id, text) VALUES (?, ?)",
+                parents.items()
+            )
+            self._conn.commit()
+    
+    def get_many(self, parent_ids: List[str]) -> Dict[str, str]:
+        """Fetch parent texts by id; unknown ids are left out"""
+        if not parent_ids:
+            return {}
+        placeholders = ",".join("?" * len(parent_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, text FROM parents WHERE id IN ({placeholders})",
+                parent_ids
+            ).fetchall()
+        return dict(rows)
+    
+    def delete_many(self, parent_ids: List[str]):
+        """Delete parent texts by id"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM parents WHERE id = ?", [(id_,) for id_ in parent_ids]
+            )
+            self._conn.commit()
+    
+    def clear(self):
+        """Delete every stored parent"""
+        with self._lock:
+            self._conn.execute("DELETE FROM parents")
+            self._conn.commit()
+
+
 class VectorStoreManager:
     """Manage embeddings and ChromaDB operations"""
     
     def __init__(self, 
                  collection_name: str = config.COLLECTION_NAME,
-                 persist_directory: Path = config.VECTORSTORE_DIR):
+                 persist_directory: Path = config.VECTORSTORE_DIR,
+                 backend: str = config.VECTOR_BACKEND):
         """
         Initialize vector store manager
         
         Args:
             collection_name: Name of ChromaDB collection
             persist_directory: Where to persist the vector database
+            backend: "chroma", or "hnswlib" for a flat-file hnswlib index
         """
         self.collection_name = collection_name
         self.persist_directory = persist_directory
+        self.backend = backend
         
-        # Initialize embedding model
-        print(f"Loading embedding model: {config.EMBEDDING_MODEL}")
-        self.embedding_model = SentenceTransformer(config.EMBEDDING_MODEL)
-        print("✓ Embedding model loaded\n")
+        # Initialize embedding models (loaded once per process)
+        self.embedding_precision = resolve_precision(config.EMBEDDING_PRECISION)
+        self.embedding_model = load_embedding_model(config.EMBEDDING_MODEL,
+                                                    self.embedding_precision)
+        self.query_model = load_query_model(config.EMBEDDING_MODEL)
         
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=str(persist_directory),
-            settings=Settings(anonymized_telemetry=False)
-        )
+        if backend == "hnswlib":
+            from src.hnsw_store import HnswCollection
+            
+            self.client = None
+            self.collection = HnswCollection(
+                collection_name, persist_directory,
+                dim=self.embedding_model.get_sentence_embedding_dimension()
+            )
+        
+        # Initialize ChromaDB client: a long-lived server if configured
+        # (`chroma run --path vectorstore`), otherwise embedded
+        elif config.CHROMA_HOST:
+            self.client = chromadb.HttpClient(
+                host=config.CHROMA_HOST,
+                port=config.CHROMA_PORT,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        else:
+            self.client = chromadb.PersistentClient(
+                path=str(persist_directory),
+                settings=Settings(anonymized_telemetry=False)
+            )
         
         # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={
-                "description": "Compliance documents for RAG system",
-                "hnsw:space": "cosine" 
-                }
-        )
+        if self.client is not None:
+            self.collection = self.client.get_or_create_collection(
+                name=collection_name,
+                metadata=self._collection_metadata()
+            )
+        
+        # Parent chunks for the embedded children (see DocumentProcessor.chunk_text)
+        self.parents = ParentStore(persist_directory / config.PARENT_STORE_PATH.name)
+    
+    @staticmethod
+    def _collection_metadata(vector_count: int = 0) -> Dict:
+        """Collection settings, applied when the collection is created"""
+        hnsw = configure_hnsw_params(vector_count)
+        return {
+            "description": "Compliance documents for RAG system",
+            # Embeddings are unit-norm on both sides, so inner product ranks
+            # like cosine without normalizing per insert and query
+            "hnsw:space": "ip",
+            "hnsw:M": hnsw["M"],
+            "hnsw:construction_ef": hnsw["ef_construction"],
+            # Candidate list size per query; covers the retriever's default
+            # n_results (hnswlib raises it to n_results when that is larger)
+            "hnsw:search_ef": hnsw["ef_search"],
+        }
+    
+    def start_encode_pool(self, n_texts: int) -> Optional[Dict]:
+        """
+        Start a multi-process encode pool for large ingests, else None
+        
+        One worker per GPU, or on CPU one per EMBED_CPU_THREADS cores. Below
+        MULTIPROC_THRESHOLD texts, or with a single target device, it is
+        skipped: process start-up and IPC then cost more than they save.
+        """
+        if n_texts <= config.MULTIPROC_THRESHOLD or self.embedding_precision == "bf16":
+            # bf16 relies on autocast in this process, which workers don't inherit
+            return None
+        if self.embedding_model.backend != "torch" or config.EMBEDDING_COMPILE:
+            # ONNX/OpenVINO sessions already spread one call over the cores,
+            # and a compiled module doesn't survive the trip to a worker
+            return None
+        
+        if DEVICE == "cuda":
+            target_devices = [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+        else:
+            target_devices = ["cpu"] * ((os.cpu_count() or 1) // config.EMBED_CPU_THREADS)
+        if len(target_devices) < 2:
+            return None
+        
+        print(f"Starting encode pool on {len(target_devices)} workers")
+        return self.embedding_model.start_multi_process_pool(target_devices=target_devices)
     
-    def generate_embeddings(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+    def generate_embeddings(self, texts: List[str], batch_size: int = 32,
+                            pool: Optional[Dict] = None) -> np.ndarray:
         """
         Generate embeddings for a list of texts
         
+        Pass large lists rather than pre-chunked ones: encode() sorts them by
+        length, so each mini-batch pads only to its own longest text, and
+        returns the embeddings in the caller's order.
+        
         Args:
             texts: List of text strings to embed
             batch_size: Batch size for embedding generation
+            pool: Optional pool from start_encode_pool to shard the texts over
             
         Returns:
-            List of embedding vectors
+            (len(texts), dim) float32 array of L2-normalized rows
         """
-        embeddings = self.embedding_model.encode(
-            texts,
-            batch_size=batch_size,
-            show_progress_bar=True,
-            convert_to_numpy=True
+        # Repeated chunks (headers, footers, boilerplate clauses) are encoded once
+        unique_texts = list(dict.fromkeys(texts))
+        autocast = (
+            torch.autocast(device_type="cuda", dtype=torch.bfloat16)
+            if self.embedding_precision == "bf16" else contextlib.nullcontext()
         )
-        return embeddings.tolist()
+        with torch.inference_mode(), autocast:
+            embeddings = self.embedding_model.encode(
+                unique_texts,
+                batch_size=batch_size,
+                show_progress_bar=True,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                pool=pool,
+                chunk_size=config.MULTIPROC_CHUNK_SIZE if pool else None
+            )
+        if len(unique_texts) < len(texts):
+            text_to_idx = {text: i for i, text in enumerate(unique_texts)}
+            embeddings = embeddings[[text_to_idx[text] for text in texts]]
+        # No .tolist(): nested lists box every value as a Python float. Both
+        # stores take float32, so that is what's returned (a no-op copy-wise)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
     
-    def add_documents(self, chunks: List[Dict], batch_size: int = 100):
+    def add_documents(self, chunks: Iterable[Dict], batch_size: Optional[int] = None,
+                      embedding_batch_size: int = 256,
+                      expected_count: Optional[int] = None) -> int:
         """
         Add document chunks to vector store
         
+        Chunks are consumed lazily in large batches (large encode calls keep
+        the matmuls big) while a writer thread inserts the previous batch into
+        Chroma, so document parsing, encoding and Chroma's disk writes overlap
+        when chunks come from a generator such as DocumentProcessor.iter_chunks.
+        
         Args:
-            chunks: List of dicts with 'text' and 'metadata' keys
-            batch_size: Number of documents to process at once
+            chunks: Iterable of dicts with 'text' and 'metadata' keys, plus
+                'parent_text' for child chunks
+            batch_size: Number of documents embedded and written at once
+                (default: config.INGEST_BATCH_SIZE, capped at the largest
+                batch the Chroma client accepts)
+            embedding_batch_size: Batch size for embedding generation
+            expected_count: Estimated chunk count for an unsized iterable
+                (e.g. DocumentProcessor.estimate_chunk_count), used to
+                decide on an encode pool (reset_collection sizes the HNSW
+                graph). Without it, only the first batch is looked at, so a
+                longer stream is treated as if it were one batch.
+            
+        Returns:
+            Number of chunks added (chunks already stored are skipped)
         """
-        print(f"Adding {len(chunks)} chunks to vector store...")
+        batch_size = batch_size or config.INGEST_BATCH_SIZE
+        if self.client is not None:
+            batch_size = min(batch_size, self.client.get_max_batch_size())
         
-        # Process in batches
-        for i in tqdm(range(0, len(chunks), batch_size), desc="Processing batches"):
-            batch = chunks[i:i + batch_size]
-            
-            # Extract texts and metadata
-            texts = [chunk['text'] for chunk in batch]
-            metadatas = [chunk['metadata'] for chunk in batch]
-            
-            # Generate IDs (using index for simplicity)
-            ids = [f"doc_{i+j}" for j in range(len(batch))]
+        total = None  # exact chunk count, when known (progress bar total)
+        if hasattr(chunks, '__len__'):
+            total = len(chunks)
+            expected_count = total if expected_count is None else expected_count
+        elif expected_count is None:
+            # Peek one batch, which is read before encoding starts anyway; a
+            # stream that ends inside it is counted exactly
+            head = list(islice(chunks, batch_size + 1))
+            expected_count = len(head)
+            if expected_count <= batch_size:
+                total = expected_count
+            chunks = chain(head, chunks)
+        print(f"Adding {total if total is not None else f'~{expected_count}'} "
+              f"chunks to vector store...")
+        
+        chunks = iter(chunks)
+        added = skipped = 0
+        pending = deque()
+        ids_by_source = defaultdict(set)  # every chunk id this ingest produced
+        pool = self.start_encode_pool(expected_count)
+        
+        try:
+            # One writer: Chroma serializes writes anyway, and order stays stable
+            with ThreadPoolExecutor(max_workers=1) as writer, \
+                    tqdm(total=total, desc="Processing chunks") as progress:
+                while batch := list(islice(chunks, batch_size)):
+                    progress.update(len(batch))
+                    
+                    # Ids are content-derived, so chunks already stored (re-runs,
+                    # incremental ingests) are skipped before any embedding
+                    batch_ids = [chunk_id(chunk) for chunk in batch]
+                    for id_, chunk in zip(batch_ids, batch):
+                        ids_by_source[chunk['metadata'].get('source', '')].add(id_)
+                    existing = set(self.collection.get(ids=batch_ids, include=[])['ids'])
+                    new_chunks = {
+                        id_: chunk for id_, chunk in zip(batch_ids, batch)
+                        if id_ not in existing
+                    }
+                    skipped += len(batch) - len(new_chunks)
+                    if not new_chunks:
+                        continue
+                    batch_ids, batch = list(new_chunks), list(new_chunks.values())
+                    
+                    # Parents go to the sidecar only; Chroma indexes the children
+                    self.parents.put_many({
+                        chunk['metadata']['parent_id']: chunk['parent_text']
+                        for chunk in batch if 'parent_text' in chunk
+                    })
+                    
+                    batch_texts = [chunk['text'] for chunk in batch]
+                    embeddings = self.generate_embeddings(batch_texts,
+                                                          batch_size=embedding_batch_size,
+                                                          pool=pool)
+                    
+                    # Add to collection in the background; upsert so an id that
+                    # lands between the check and the write doesn't fail the batch
+                    pending.append(writer.submit(
+                        self.collection.upsert,
+                        embeddings=embeddings,
+                        documents=batch_texts,
+                        metadatas=[chunk['metadata'] for chunk in batch],
+                        ids=batch_ids
+                    ))
+                    added += len(batch)
+                    
+                    # Backpressure: bound the embedded batches waiting in memory,
+                    # and surface write errors early
+                    while len(pending) > config.INGEST_MAX_PENDING_WRITES:
+                        pending.popleft().result()
+                
+                for future in pending:
+                    future.result()
             
-            # Generate embeddings
-            embeddings = self.generate_embeddings(texts, batch_size=32)
+            removed = self._remove_stale_chunks(ids_by_source, batch_size)
             
-            # Add to collection
-            self.collection.add(
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
+            # hnswlib keeps appends in memory; write its index file once
+            if self.client is None:
+                self.collection.persist()
+        finally:
+            if pool is not None:
+                self.embedding_model.stop_multi_process_pool(pool)
         
-        print(f"✓ Added {len(chunks)} chunks to collection '{self.collection_name}'")
+        print(f"✓ Added {added} chunks to collection '{self.collection_name}'"
+              + (f" ({skipped} already present)" if skipped else "")
+              + (f", removed {removed} stale" if removed else ""))
         print(f"✓ Total documents in collection: {self.collection.count()}\n")
+        return added
+    
+    def _remove_stale_chunks(self, ids_by_source: Dict[str, set], batch_size: int) -> int:
+        """
+        Delete stored chunks of re-ingested sources that this ingest didn't produce
+        
+        An edited document gets new chunk ids; without this its old children
+        stay searchable next to the new ones. Parents only those children
+        referenced go too. Sources that failed to parse produced no ids, so
+        they are never touched.
+        
+        Returns:
+            Number of chunks deleted
+        """
+        removed = 0
+        for source, ids in ids_by_source.items():
+            stored = self.collection.get(where={"source": source}, include=["metadatas"])
+            stale_ids, stale_parents, kept_parents = [], set(), set()
+            for id_, metadata in zip(stored['ids'], stored['metadatas']):
+                if id_ in ids:
+                    kept_parents.add(metadata.get('parent_id'))
+                else:
+                    stale_ids.append(id_)
+                    stale_parents.add(metadata.get('parent_id'))
+            
+            for start in range(0, len(stale_ids), batch_size):
+                self.collection.delete(ids=stale_ids[start:start + batch_size])
+            self.parents.delete_many(list(stale_parents - kept_parents - {None}))
+            removed += len(stale_ids)
+        return removed
+    
+    def embed_query(self, query_text: str) -> np.ndarray:
+        """Embed a query (L2-normalized) with the query encoder; repeat queries hit an LRU cache"""
+        return _cached_query_embedding(query_text, config.EMBEDDING_MODEL)
     
     def query(self, 
               query_text: str, 
@@ -125,12 +560,12 @@ class VectorStoreManager:
         Returns:
             Dict with 'documents', 'metadatas', 'distances', and 'ids'
         """
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode([query_text]).tolist()
+        # Generate query embedding (ndarray straight through, no list round-trip)
+        query_embedding = self.embed_query(query_text)
         
         # Query collection
         results = self.collection.query(
-            query_embeddings=query_embedding,
+            query_embeddings=query_embedding[np.newaxis, :],
             n_results=n_results,
             where=filter_metadata,
             include=["documents", "metadatas", "distances"]
@@ -138,32 +573,54 @@ class VectorStoreManager:
         
         return results
     
+    def get_parent_texts(self, parent_ids: List[str]) -> Dict[str, str]:
+        """Look up parent chunk texts by parent_id"""
+        return self.parents.get_many(parent_ids)
+    
     def get_collection_stats(self) -> Dict:
         """Get statistics about the collection"""
         count = self.collection.count()
         
-        # Get sample to analyze metadata
+        # Metadata only, and a bounded sample: reading every record's metadata
+        # grows with the corpus on each call
+        category_counts = Counter()
         if count > 0:
-            sample = self.collection.get(limit=min(count, 100))
-            categories = set(meta.get('category', 'unknown') 
-                           for meta in sample['metadatas'])
-        else:
-            categories = set()
+            metadatas = self.collection.get(
+                limit=config.STATS_SAMPLE_SIZE, include=["metadatas"]
+            )['metadatas']
+            category_counts.update(meta.get('category', 'unknown') for meta in metadatas)
         
         return {
             'total_chunks': count,
+            'sampled_chunks': sum(category_counts.values()),
             'collection_name': self.collection_name,
-            'categories': list(categories),
+            'categories': list(category_counts),
+            'category_counts': dict(category_counts),
             'embedding_model': config.EMBEDDING_MODEL
         }
     
-    def reset_collection(self):
-        """Delete and recreate the collection (useful for testing)"""
-        self.client.delete_collection(name=self.collection_name)
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"description": "Compliance documents for RAG system"}
-        )
+    def reset_collection(self, expected_count: int = 0):
+        """
+        Delete and recreate the collection (rebuilds, testing)
+        
+        HNSW parameters are fixed when a Chroma collection is created, so
+        this is where they are sized for the corpus about to go in. Other
+        clients holding the old collection must reconnect afterwards, which
+        is why add_documents never recreates one by itself.
+        
+        Args:
+            expected_count: Vectors the rebuilt collection will hold (e.g.
+                DocumentProcessor.estimate_chunk_count)
+        """
+        if self.client is None:
+            self.collection.delete_all()
+        else:
+            self.client.delete_collection(name=self.collection_name)
+            self.collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata=self._collection_metadata(expected_count)
+            )
+        self.parents.clear()
         print(f"✓ Reset collection '{self.collection_name}'")
 
 
@@ -175,33 +632,33 @@ def main():
     print("BUILDING VECTOR STORE")
     print("=" * 80 + "\n")
     
-    # Step 1: Process documents
-    print("Step 1: Processing documents...")
-    processor = DocumentProcessor()
-    chunks = processor.process_directory(config.RAW_DATA_DIR)
-    
-    if not chunks:
-        print("✗ No documents found! Please add documents to data/raw/")
-        return
-    
-    print(f"✓ Processed {len(chunks)} chunks\n")
-    
-    # Step 2: Initialize vector store
-    print("Step 2: Initializing vector store...")
+    # Step 1: Initialize vector store
+    print("Step 1: Initializing vector store...")
     vectorstore = VectorStoreManager()
     
-    # Optional: Reset if rebuilding
-    # vectorstore.reset_collection()
+    processor = DocumentProcessor()
+    expected_count = processor.estimate_chunk_count(config.RAW_DATA_DIR)
+    
+    # Optional: Reset if rebuilding (also sizes the HNSW graph for the corpus)
+    # vectorstore.reset_collection(expected_count)
     
-    # Step 3: Add documents
+    # Steps 2-3: Process documents, generating embeddings as chunks arrive
+    print("Step 2: Processing documents...")
     print("Step 3: Generating embeddings and adding to vector store...")
-    vectorstore.add_documents(chunks)
+    vectorstore.add_documents(
+        processor.iter_chunks(config.RAW_DATA_DIR),
+        expected_count=expected_count
+    )
+    if vectorstore.collection.count() == 0:
+        print("✗ No documents found! Please add documents to data/raw/")
+        return
     
     # Step 4: Show statistics
     print("Step 4: Collection statistics")
     stats = vectorstore.get_collection_stats()
     print(f"  • Total chunks: {stats['total_chunks']}")
-    print(f"  • Categories: {', '.join(stats['categories'])}")
+    print(f"  • Categories (in {stats['sampled_chunks']} sampled chunks): "
+          f"{', '.join(stats['categories'])}")
     print(f"  • Embedding model: {stats['embedding_model']}")
     print()
     
@@ -3,13 +3,36 @@
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import pdfplumber
 
 file_path = "data/raw/fda_guidance/GFI106.pdf"
-with pdfplumber.open(file_path) as pdf:
-    text = "\n".join(page.extract_text() for page in pdf.pages)
 
-print(text)
+
+def extract_pages(file_path, start, stop):
+    # pdfplumber objects don't pickle, so each worker opens its own copy
+    with pdfplumber.open(file_path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:stop]]
+
+
+if __name__ == "__main__":
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+
+    # one contiguous page range per worker; map() keeps them in order
+    workers = min(os.cpu_count() or 1, page_count) or 1
+    step = max(1, -(-page_count // workers))
+    starts = range(0, page_count, step)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pages = [text for chunk in pool.map(extract_pages, repeat(file_path),
+                                            starts, [s + step for s in starts])
+                 for text in chunk]
+
+    text = "\n".join(pages)
+    print(text)
 
 
 # loader = PyPDFLoader(file_path)
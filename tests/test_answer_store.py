@@ -0,0 +1,38 @@
+# tests for the persisted answer store
+
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+
+# add project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.answer_store import AnswerStore
+
+
+def test_answers_survive_reopen(tmp_path):
+    path = tmp_path / "answers.sqlite3"
+    AnswerStore(path).put("llama3.1", 5, "v1", "What is GMP?", {"answer": "rules"})
+
+    store = AnswerStore(path)
+    # Lookups use the normalized query, like the semantic cache
+    assert store.get("llama3.1", 5, "v1", "  what is GMP? ") == {"answer": "rules"}
+    assert store.get("llama3.1", 5, "v2", "What is GMP?") is None
+    assert store.get("llama3.1", 3, "v1", "What is GMP?") is None
+
+
+def test_oldest_answers_evicted(tmp_path):
+    store = AnswerStore(tmp_path / "answers.sqlite3", max_entries=2)
+    for i in range(3):
+        store.put("m", 5, "v", f"q{i}", {"answer": i})
+    # Replacing an answer makes it the newest
+    store.put("m", 5, "v", "q1", {"answer": "again"})
+    store.put("m", 5, "v", "q3", {"answer": 3})
+
+    assert store.get("m", 5, "v", "q0") is None
+    assert store.get("m", 5, "v", "q2") is None
+    assert store.get("m", 5, "v", "q1") == {"answer": "again"}
+    assert store.get("m", 5, "v", "q3") == {"answer": 3}
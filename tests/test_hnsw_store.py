@@ -0,0 +1,119 @@
+# tests for the hnswlib-backed collection
+
+import gc
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("hnswlib")
+
+# add project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.hnsw_store import HnswCollection
+
+DIM = 8
+
+
+def unit(seed):
+    vector = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def add_records(collection, seeds, category="guidance"):
+    collection.add(
+        embeddings=np.stack([unit(seed) for seed in seeds]),
+        documents=[f"doc {seed}" for seed in seeds],
+        metadatas=[{"category": category, "seed": seed} for seed in seeds],
+        ids=[f"id{seed}" for seed in seeds],
+    )
+
+
+def test_round_trip(tmp_path):
+    collection = HnswCollection("test", tmp_path, DIM)
+    add_records(collection, range(20))
+    collection.persist()
+
+    reopened = HnswCollection("test", tmp_path, DIM)
+    assert reopened.count() == 20
+    result = reopened.query(unit(7)[None, :], n_results=1)
+    assert result["ids"] == [["id7"]]
+    assert result["documents"] == [["doc 7"]]
+    assert result["metadatas"] == [[{"category": "guidance", "seed": 7}]]
+
+
+def test_live_writer_keeps_unpersisted_records(tmp_path):
+    writer = HnswCollection("test", tmp_path, DIM)
+    add_records(writer, range(5))
+    writer.persist()
+    add_records(writer, range(5, 10))
+
+    # e.g. the app starting while an ingest is still running
+    reader = HnswCollection("test", tmp_path, DIM)
+    assert reader.count() == 10
+    with pytest.raises(RuntimeError):
+        add_records(reader, range(10, 12))
+
+    writer.persist()
+    assert HnswCollection("test", tmp_path, DIM).count() == 10
+
+
+def test_dead_writer_records_dropped_on_reopen(tmp_path):
+    writer = HnswCollection("test", tmp_path, DIM)
+    add_records(writer, range(5))
+    writer.persist()
+    add_records(writer, range(5, 10))
+    # The writer dies before persisting; its lock goes with it
+    del writer
+    gc.collect()
+
+    reopened = HnswCollection("test", tmp_path, DIM)
+    assert reopened.count() == 5
+    assert reopened.get(ids=["id7"], include=[])["ids"] == []
+
+
+def test_upsert_replaces_vector_and_row(tmp_path):
+    collection = HnswCollection("test", tmp_path, DIM)
+    add_records(collection, range(10))
+    collection.upsert(
+        embeddings=unit(100)[None, :],
+        documents=["replaced"],
+        metadatas=[{"category": "guidance", "seed": 100}],
+        ids=["id3"],
+    )
+
+    assert collection.count() == 10
+    assert collection.get(ids=["id3"])["documents"] == ["replaced"]
+    # the old vector no longer answers for id3
+    nearest = collection.query(unit(3)[None, :], n_results=10)
+    assert nearest["ids"][0].count("id3") == 1
+    assert collection.query(unit(100)[None, :], n_results=1)["ids"] == [["id3"]]
+
+
+def test_filtered_query(tmp_path):
+    collection = HnswCollection("test", tmp_path, DIM)
+    add_records(collection, range(10), category="guidance")
+    add_records(collection, range(10, 13), category="warning_letter")
+
+    result = collection.query(unit(1)[None, :], n_results=5,
+                              where={"category": "warning_letter"})
+    assert sorted(result["ids"][0]) == ["id10", "id11", "id12"]
+    assert all(m["category"] == "warning_letter" for m in result["metadatas"][0])
+
+
+def test_delete_by_filtered_ids(tmp_path):
+    collection = HnswCollection("test", tmp_path, DIM)
+    add_records(collection, range(5), category="guidance")
+    add_records(collection, range(5, 8), category="warning_letter")
+
+    letters = collection.get(where={"category": "warning_letter"}, include=[])
+    assert sorted(letters["ids"]) == ["id5", "id6", "id7"]
+    collection.delete(ids=letters["ids"])
+    collection.persist()
+
+    reopened = HnswCollection("test", tmp_path, DIM)
+    assert reopened.count() == 5
+    nearest = reopened.query(unit(6)[None, :], n_results=5)
+    assert "id6" not in nearest["ids"][0]